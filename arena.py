@@ -0,0 +1,195 @@
+import math
+from collections import namedtuple
+
+
+class ArenaGeometry(namedtuple('ArenaGeometry', [
+    'left', 'top', 'right', 'bottom',
+    'columns', 'rows',
+    'region_width', 'region_height',
+    'wall_xs', 'wall_ys',
+    'vertical_gaps', 'horizontal_gaps',
+    'region_boxes',
+])):
+    """
+    Outer bounds, dividing walls and wall gaps of the arena, computed once per
+    game. The walls split the arena into a grid of columns x rows regions of
+    region_width x region_height, the last column and row taking any
+    remainder. wall_xs are the vertical walls and wall_ys the horizontal ones.
+    vertical_gaps[wall][row] lists the (start, end) intervals where a vertical
+    wall is open beside a row of regions, horizontal_gaps[wall][column] the
+    same for a horizontal wall beside a column. region_boxes holds the
+    (left, top, right, bottom) of every region inside the arena.
+    """
+    __slots__ = ()
+
+    @property
+    def regions(self):
+        return self.columns * self.rows
+
+    def column_of(self, x):
+        column = int((x - self.left) // self.region_width)
+        return 0 if column < 0 else min(column, self.columns - 1)
+
+    def row_of(self, y):
+        row = int((y - self.top) // self.region_height)
+        return 0 if row < 0 else min(row, self.rows - 1)
+
+    def region_of(self, position):
+        # Regions are numbered row by row from the top left; points outside the arena belong to the nearest one
+        column = int((position[0] - self.left) // self.region_width)
+        row = int((position[1] - self.top) // self.region_height)
+        column = 0 if column < 0 else min(column, self.columns - 1)
+        row = 0 if row < 0 else min(row, self.rows - 1)
+        return row * self.columns + column
+
+    def region_bounds(self, region):
+        """
+        Return (min_x, min_y, max_x, max_y) of the points region_of() puts in
+        the given region, with the max edges excluded.
+        """
+        row, column = divmod(region, self.columns)
+        min_x = self.wall_xs[column - 1] if column else -math.inf
+        max_x = self.wall_xs[column] if column < self.columns - 1 else math.inf
+        min_y = self.wall_ys[row - 1] if row else -math.inf
+        max_y = self.wall_ys[row] if row < self.rows - 1 else math.inf
+        return (min_x, min_y, max_x, max_y)
+
+    def region_area(self, region):
+        # ((left, top), (right, bottom)) of a region inside the arena, e.g. to spawn life forms in
+        left, top, right, bottom = self.region_boxes[region]
+        return (left, top), (right, bottom)
+
+    def confine(self, position, half_width, half_height):
+        """
+        Keep an [x, y] position, updated in place, inside the arena and inside
+        its region unless it is passing through a gap. Returns True when a
+        boundary was hit. Only the walls of the position's own region are
+        looked at, so the cost does not grow with the number of regions.
+        """
+        x, y = position
+        # The region is taken before any clamping
+        column = int((x - self.left) // self.region_width)
+        row = int((y - self.top) // self.region_height)
+        column = 0 if column < 0 else min(column, self.columns - 1)
+        row = 0 if row < 0 else min(row, self.rows - 1)
+
+        # Nearly every call is well inside its region, which touches nothing
+        left, top, right, bottom = self.region_boxes[row * self.columns + column]
+        if left + half_width <= x <= right - half_width and top + half_height <= y <= bottom - half_height:
+            return False
+        hit = False
+
+        # Outer edges
+        if y - half_height < self.top:
+            y = self.top + half_height
+            hit = True
+        if x - half_width < self.left:
+            x = self.left + half_width
+            hit = True
+        elif x + half_width > self.right:
+            x = self.right - half_width
+            hit = True
+        if y + half_height > self.bottom:
+            y = self.bottom - half_height
+            hit = True
+
+        # Vertical walls on either side of the region
+        if self.columns > 1:
+            gap_row = self.row_of(y)
+            if column < self.columns - 1:
+                wall = self.wall_xs[column]
+                if x + half_width > wall and not _in_gap(self.vertical_gaps[column][gap_row], y):
+                    x = wall - half_width
+                    hit = True
+            if column > 0:
+                wall = self.wall_xs[column - 1]
+                if x - half_width < wall and not _in_gap(self.vertical_gaps[column - 1][gap_row], y):
+                    x = wall + half_width
+                    hit = True
+
+        # Horizontal walls above and below the region
+        if self.rows > 1:
+            gap_column = self.column_of(x)
+            if row < self.rows - 1:
+                wall = self.wall_ys[row]
+                if y + half_height > wall and not _in_gap(self.horizontal_gaps[row][gap_column], x):
+                    y = wall - half_height
+                    hit = True
+            if row > 0:
+                wall = self.wall_ys[row - 1]
+                if y - half_height < wall and not _in_gap(self.horizontal_gaps[row - 1][gap_column], x):
+                    y = wall + half_height
+                    hit = True
+
+        position[0] = x
+        position[1] = y
+        return hit
+
+
+# Function to tell whether a coordinate along a wall lies in one of its gap intervals
+def _in_gap(gaps, value):
+    for start, end in gaps:
+        if start <= value <= end:
+            return True
+    return False
+
+
+# Function to place the gaps of one wall segment between two neighboring regions
+def _segment_gaps(start, end, gap_ratio, crossing_at_start, crossing_at_end):
+    """
+    Each segment is open over gap_ratio of its length. The opening sits at
+    the ends where other walls cross, split between them, so the regions
+    around a crossing all meet there; a segment without crossings is open in
+    its middle.
+    """
+    gap_size = (end - start) * gap_ratio
+    if crossing_at_start and crossing_at_end:
+        return ((start, start + gap_size / 2), (end - gap_size / 2, end))
+    if crossing_at_start:
+        return ((start, start + gap_size),)
+    if crossing_at_end:
+        return ((end - gap_size, end),)
+    middle = (start + end) / 2
+    return ((middle - gap_size / 2, middle + gap_size / 2),)
+
+
+def build_arena(width, height, header_height, gap_ratio, columns=2, rows=2):
+    # Walls split the area below the header into columns x rows regions
+    region_width = width // columns
+    region_height = (height - header_height) // rows
+    if region_width < 1 or region_height < 1:
+        raise ValueError(f"a {width}x{height} arena is too small for {columns}x{rows} regions")
+    wall_xs = tuple(region_width * (column + 1) for column in range(columns - 1))
+    wall_ys = tuple(header_height + region_height * (row + 1) for row in range(rows - 1))
+    xs = (0,) + wall_xs + (width,)
+    ys = (header_height,) + wall_ys + (height,)
+    region_boxes = tuple(
+        (xs[column], ys[row], xs[column + 1], ys[row + 1]) for row in range(rows) for column in range(columns)
+    )
+
+    # Every wall segment between two neighboring regions has its own gaps
+    vertical_gaps = tuple(
+        tuple(_segment_gaps(ys[row], ys[row + 1], gap_ratio, row > 0, row < rows - 1) for row in range(rows))
+        for _ in wall_xs
+    )
+    horizontal_gaps = tuple(
+        tuple(_segment_gaps(xs[column], xs[column + 1], gap_ratio, column > 0, column < columns - 1)
+              for column in range(columns))
+        for _ in wall_ys
+    )
+
+    return ArenaGeometry(
+        left=0,
+        top=header_height,
+        right=width,
+        bottom=height,
+        columns=columns,
+        rows=rows,
+        region_width=region_width,
+        region_height=region_height,
+        wall_xs=wall_xs,
+        wall_ys=wall_ys,
+        vertical_gaps=vertical_gaps,
+        horizontal_gaps=horizontal_gaps,
+        region_boxes=region_boxes,
+    )
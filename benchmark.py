@@ -0,0 +1,476 @@
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from profiling import Profiler, percentiles
+from simulation import (
+    WIDTH,
+    HEIGHT,
+    REGION_COLUMNS,
+    REGION_ROWS,
+    LifeForm,
+    Simulation,
+    choose_life_type_parameters,
+    region_life_types,
+)
+from vectorized import VectorizedSimulation
+
+# Seed every scenario's world is built from
+BENCHMARK_SEED = 1
+
+# Results new runs are compared against
+BASELINE_FILE = 'benchmark_baseline.json'
+
+# Fraction by which a metric may be worse than its baseline before it counts as a regression
+TOLERANCE = 0.25
+
+# KiB by which an allocation metric may also be worse, so a tick of 1 KiB going to 2 KiB is not a regression
+ALLOCATION_FLOOR_KIB = 16
+
+# Runs of every scenario; every compared metric is kept at its best run, as other load on the
+# machine only ever slows a run down
+REPEATS = 3
+
+# Ticks run before measuring, so first targets are found and caches are filled
+WARMUP_TICKS = 2
+
+# Most ticks run with the profiler attached for the phase times
+PROFILE_TICKS = 100
+
+# Ticks traced for allocations; tracing slows everything down several times
+ALLOCATION_TICKS = 3
+
+# Most frames drawn for the rendering times
+RENDER_FRAMES = 20
+
+# Games started by the game reset scenario
+RESET_GAMES = 20
+
+# Distance from a wall gap's center line over which the 'gaps' layout spreads life forms
+GAP_SPREAD = 20
+
+# Width, height, columns and rows of the arena of the large grid scenarios
+GRID_ARENA = (3600, 1920, 4, 4)
+
+# Fixed scenarios: engine, number of life forms, plants, how they start out, and ticks measured,
+# plus the arena where it is not the default screen-sized one. The Python engine grows
+# quadratically with crowding, so the largest worlds run on the NumPy one
+SCENARIOS = {
+    'python-40': {'engine': 'python', 'agents': 40, 'plants': 200, 'layout': 'regions', 'ticks': 600},
+    'python-400': {'engine': 'python', 'agents': 400, 'plants': 200, 'layout': 'regions', 'ticks': 100},
+    'python-4000': {'engine': 'python', 'agents': 4000, 'plants': 200, 'layout': 'regions', 'ticks': 5},
+    'python-400-plants-20000': {'engine': 'python', 'agents': 400, 'plants': 20000, 'layout': 'regions', 'ticks': 100},
+    'python-400-crowded': {'engine': 'python', 'agents': 400, 'plants': 200, 'layout': 'crowded', 'ticks': 50},
+    'python-400-gaps': {'engine': 'python', 'agents': 400, 'plants': 200, 'layout': 'gaps', 'ticks': 50},
+    'python-4000-grid': {
+        'engine': 'python', 'agents': 4000, 'plants': 800, 'layout': 'regions', 'ticks': 5, 'arena': GRID_ARENA,
+    },
+    'numpy-4000': {'engine': 'numpy', 'agents': 4000, 'plants': 200, 'layout': 'regions', 'ticks': 30},
+    'numpy-40000': {'engine': 'numpy', 'agents': 40000, 'plants': 200, 'layout': 'regions', 'ticks': 3},
+    'numpy-4000-plants-20000': {'engine': 'numpy', 'agents': 4000, 'plants': 20000, 'layout': 'regions', 'ticks': 30},
+    'numpy-4000-crowded': {'engine': 'numpy', 'agents': 4000, 'plants': 200, 'layout': 'crowded', 'ticks': 10},
+    'numpy-4000-gaps': {'engine': 'numpy', 'agents': 4000, 'plants': 200, 'layout': 'gaps', 'ticks': 10},
+    'numpy-40000-grid': {
+        'engine': 'numpy', 'agents': 40000, 'plants': 800, 'layout': 'regions', 'ticks': 3, 'arena': GRID_ARENA,
+    },
+    'reset': {'engine': 'reset', 'games': RESET_GAMES},
+}
+
+# Metrics compared against the baseline: whether larger values are better, and how much worse
+# a metric may also be in absolute terms. Phases and allocations are compared by their median,
+# which is far steadier over a few ticks than the tail
+COMPARED_METRICS = {
+    ('ticks_per_second',): (True, 0),
+    ('tick_ms', 'p50'): (False, 0),
+    ('tick_ms', 'p95'): (False, 0),
+    ('update_ms', 'p50'): (False, 0),
+    ('targeting_ms', 'p50'): (False, 0),
+    ('render_ms', 'p50'): (False, 0),
+    ('reset_ms', 'p50'): (False, 0),
+    ('allocated_kib_per_tick', 'p50'): (False, ALLOCATION_FLOOR_KIB),
+    ('allocated_kib_per_update', 'p50'): (False, ALLOCATION_FLOOR_KIB),
+    ('allocated_kib_per_targeting', 'p50'): (False, ALLOCATION_FLOOR_KIB),
+    ('allocated_kib_per_render', 'p50'): (False, ALLOCATION_FLOOR_KIB),
+    ('allocated_kib_per_reset', 'p50'): (False, ALLOCATION_FLOOR_KIB),
+    ('peak_rss_mib',): (False, 0),
+}
+
+
+# Function to list the openings of an arena's walls as (vertical, wall, start, end), touching gaps merged
+def wall_openings(arena):
+    openings = []
+    for vertical, walls, all_gaps in (
+        (True, arena.wall_xs, arena.vertical_gaps),
+        (False, arena.wall_ys, arena.horizontal_gaps),
+    ):
+        for wall, segments in zip(walls, all_gaps):
+            for start, end in (gap for gaps in segments for gap in gaps):
+                if openings and openings[-1][:2] == (vertical, wall) and openings[-1][3] == start:
+                    openings[-1] = (vertical, wall, openings[-1][2], end)
+                else:
+                    openings.append((vertical, wall, start, end))
+    return openings
+
+
+# Function to lay out life forms, cycling through the types, as (life_type, x, y) tuples
+def layout_positions(layout, arena, life_types, agents, rng):
+    positions = []
+    openings = wall_openings(arena)
+    for index in range(agents):
+        life_type = life_types[index % len(life_types)]
+        if layout == 'regions':
+            # Every type in its own region, like a new game
+            (min_x, min_y), (max_x, max_y) = arena.region_area(index % len(life_types))
+        elif layout == 'crowded':
+            # Every type in the first region
+            (min_x, min_y), (max_x, max_y) = arena.region_area(0)
+        elif layout == 'gaps':
+            # Everyone in the openings of the walls
+            vertical, wall, start, end = rng.choice(openings)
+            if vertical:
+                min_x, max_x = wall - GAP_SPREAD, wall + GAP_SPREAD
+                min_y, max_y = start, end
+            else:
+                min_x, max_x = start, end
+                min_y, max_y = wall - GAP_SPREAD, wall + GAP_SPREAD
+        else:
+            raise ValueError(f"unknown layout {layout!r}")
+        positions.append((life_type, rng.uniform(min_x, max_x - 1), rng.uniform(min_y, max_y - 1)))
+    return positions
+
+
+# Function to build the seeded world of a scenario
+def build_world(scenario, seed=BENCHMARK_SEED):
+    rng = random.Random(seed)
+    width, height, columns, rows = scenario.get('arena', (WIDTH, HEIGHT, REGION_COLUMNS, REGION_ROWS))
+    arena_options = {'width': width, 'height': height, 'columns': columns, 'rows': rows}
+    life_types = region_life_types(columns * rows)
+    life_type_parameters = choose_life_type_parameters(rng=rng, types=life_types)
+    agents = scenario['agents']
+    plants = scenario['plants']
+    if scenario['engine'] == 'python':
+        sim = Simulation(
+            life_type_parameters, max_plants=plants, seed=rng.getrandbits(64), populate=False, **arena_options,
+        )
+        for _ in range(plants):
+            sim.add_plant(sim.new_plant())
+        for life_type, x, y in layout_positions(scenario['layout'], sim.arena, life_types, agents, rng):
+            life_form = LifeForm(life_type, position=[x, y], genome=sim.genomes[life_type], rng=sim.rng)
+            sim.add_life_form(life_form)
+            sim.life_form_examples.setdefault(life_type, life_form)
+    else:
+        sim = VectorizedSimulation(
+            life_type_parameters,
+            seed=rng.getrandbits(64),
+            num_each_life_form=0,
+            max_per_type=agents // len(life_types),
+            num_plants=plants,
+            max_plants=plants,
+            **arena_options,
+        )
+        placed = layout_positions(scenario['layout'], sim.arena, life_types, agents, rng)
+        sim.add_life_forms([life_type for life_type, _, _ in placed], [(x, y) for _, x, y in placed])
+    return sim
+
+
+# Function to time single ticks, in milliseconds, until ticks have run or the game is over
+def time_ticks(sim, ticks):
+    samples = []
+    perf_counter = time.perf_counter
+    for _ in range(ticks):
+        if sim.finished:
+            break
+        start = perf_counter()
+        sim.step()
+        samples.append((perf_counter() - start) * 1000)
+    return samples
+
+
+# Function to trace the memory allocated on top of what was live before each call, in KiB
+def trace_allocations(function, calls):
+    samples = []
+    tracemalloc.start()
+    try:
+        for _ in range(calls):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            function()
+            samples.append((tracemalloc.get_traced_memory()[1] - before) / 1024)
+    finally:
+        tracemalloc.stop()
+    return samples
+
+
+class AllocationTracer:
+    """
+    Stands in for a Profiler on a world traced with tracemalloc, adding up
+    the KiB allocated per tick by LifeForm.update and by target searches.
+    Every call counts the most memory it held on top of what was live when
+    it started, as trace_allocations() does for ticks; the searches are
+    made within updates and are included in them.
+    """
+
+    # Methods traced, and the phase their allocations go to
+    TRACED_METHODS = {'update': 'update', 'find_target': 'targeting'}
+
+    def __init__(self):
+        self.samples = {phase: [] for phase in self.TRACED_METHODS.values()}
+
+    @contextmanager
+    def tick(self, sim):
+        self.values = dict.fromkeys(self.samples, 0)
+        # Highest peak of the call in progress from before its inner calls reset it
+        self.peak = 0
+        # Life forms born during the tick do not act until the next one
+        life_forms = list(sim.life_forms)
+        for life_form in life_forms:
+            for name, phase in self.TRACED_METHODS.items():
+                setattr(life_form, name, self.traced(getattr(life_form, name), phase))
+        try:
+            yield
+        finally:
+            for life_form in life_forms:
+                for name in self.TRACED_METHODS:
+                    del life_form.__dict__[name]
+        for phase, value in self.values.items():
+            self.samples[phase].append(value / 1024)
+
+    def traced(self, method, phase):
+        def call(*args, **kwargs):
+            current, peak = tracemalloc.get_traced_memory()
+            outer_peak = max(self.peak, peak)
+            self.peak = 0
+            tracemalloc.reset_peak()
+            result = method(*args, **kwargs)
+            peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            self.values[phase] += peak - current
+            self.peak = max(outer_peak, peak)
+            return result
+
+        return call
+
+    def lap(self, phase):
+        # Phases are told apart by the methods traced
+        pass
+
+
+# Function to trace the allocations of LifeForm.update and target searches over calls ticks, in KiB per tick
+def trace_phase_allocations(sim, calls):
+    tracer = sim.profiler = AllocationTracer()
+    tracemalloc.start()
+    try:
+        sim.step(calls)
+    finally:
+        tracemalloc.stop()
+        sim.profiler = None
+    return tracer.samples
+
+
+# Function to read the peak resident memory of this process in MiB
+def peak_rss_mib():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+# Function to run one scenario; every scenario runs in a fresh process so its peak memory is its own
+def run_scenario(name, render=True):
+    scenario = SCENARIOS[name]
+    if scenario['engine'] == 'reset':
+        return run_reset_scenario(scenario)
+
+    sim = build_world(scenario)
+    sim.step(WARMUP_TICKS)
+    tick_samples = time_ticks(sim, scenario['ticks'])
+    result = {
+        'ticks': len(tick_samples),
+        'life_forms': len(sim.life_forms) if scenario['engine'] == 'python' else len(sim),
+        'ticks_per_second': len(tick_samples) / max(sum(tick_samples) / 1000, 1e-9),
+        'tick_ms': percentiles(tick_samples),
+    }
+
+    if scenario['engine'] == 'python':
+        # LifeForm.update and target searches, timed by the profiler
+        sim.profiler = Profiler()
+        sim.step(min(scenario['ticks'], PROFILE_TICKS))
+        summary = sim.profiler.summary()
+        sim.profiler = None
+        if 'life_forms' in summary:
+            result['update_ms'] = summary['life_forms']
+            result['targeting_ms'] = summary['find_target']
+
+    result['allocated_kib_per_tick'] = percentiles(trace_allocations(sim.step, ALLOCATION_TICKS))
+    if scenario['engine'] == 'python':
+        phase_allocations = trace_phase_allocations(sim, ALLOCATION_TICKS)
+        result['allocated_kib_per_update'] = percentiles(phase_allocations['update'])
+        result['allocated_kib_per_targeting'] = percentiles(phase_allocations['targeting'])
+
+    if render and scenario['engine'] == 'python' and 'arena' not in scenario:
+        # Full redraws of the game view on a display that is never shown; the viewer only shows the default arena.
+        # The viewer is imported only here, so headless runs do without Pygame
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        import synthlife
+        synthlife.init_display()
+        synthlife.draw_game(synthlife.screen, sim, sim.calculate_energy_metrics())
+        render_samples = []
+        for _ in range(min(scenario['ticks'], RENDER_FRAMES)):
+            sim.step()
+            energy_metrics = sim.calculate_energy_metrics()
+            start = time.perf_counter()
+            synthlife.draw_game(synthlife.screen, sim, energy_metrics)
+            render_samples.append((time.perf_counter() - start) * 1000)
+        result['render_ms'] = percentiles(render_samples)
+        result['allocated_kib_per_render'] = percentiles(trace_allocations(
+            lambda: synthlife.draw_game(synthlife.screen, sim, energy_metrics), ALLOCATION_TICKS,
+        ))
+
+    result['peak_rss_mib'] = peak_rss_mib()
+    return result
+
+
+# Function to time the viewer starting new games
+def run_reset_scenario(scenario):
+    # New games are started by the viewer, so this scenario needs Pygame
+    import synthlife
+    synthlife.game_rng = random.Random(BENCHMARK_SEED)
+    synthlife.initialize_game()
+    samples = []
+    for _ in range(scenario['games']):
+        start = time.perf_counter()
+        synthlife.initialize_game()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'games': len(samples),
+        'reset_ms': percentiles(samples),
+        'allocated_kib_per_reset': percentiles(trace_allocations(synthlife.initialize_game, ALLOCATION_TICKS)),
+        'peak_rss_mib': peak_rss_mib(),
+    }
+
+
+# Function to rank the runs of a scenario, faster runs higher
+def run_speed(result):
+    if 'reset_ms' in result:
+        return -result['reset_ms']['p50']
+    return result['ticks_per_second']
+
+
+# Function to read a metric of a result by its path, or None if the result does not have it
+def metric(result, path):
+    for key in path:
+        result = result.get(key) if isinstance(result, dict) else None
+    return result
+
+
+# Function to merge the runs of a scenario: the fastest run, with every compared metric at its best over all runs
+def best_run(runs):
+    best = max(runs, key=run_speed)
+    best = {key: dict(value) if isinstance(value, dict) else value for key, value in best.items()}
+    for path, (higher_is_better, _) in COMPARED_METRICS.items():
+        values = [value for value in (metric(run, path) for run in runs) if value is not None]
+        if values:
+            *keys, last = path
+            metric(best, keys)[last] = max(values) if higher_is_better else min(values)
+    return best
+
+
+# Function to list the metrics of results that are worse than the baseline by more than tolerance and the floor
+def compare(results, baseline, tolerance=TOLERANCE):
+    regressions = []
+    for name, result in results['scenarios'].items():
+        base = baseline['scenarios'].get(name)
+        if base is None:
+            continue
+        for path, (higher_is_better, floor) in COMPARED_METRICS.items():
+            value, base_value = metric(result, path), metric(base, path)
+            if value is None or base_value is None:
+                continue
+            worse_by = base_value - value if higher_is_better else value - base_value
+            if worse_by > base_value * tolerance and worse_by > floor:
+                regressions.append(f"{name} {'.'.join(path)}: {value:.3f} against {base_value:.3f} in the baseline")
+    return regressions
+
+
+# Function to describe one scenario's results in a line
+def describe(name, result):
+    if 'reset_ms' in result:
+        timing = f"reset p50/p95/p99 {result['reset_ms']['p50']:.2f}/{result['reset_ms']['p95']:.2f}/{result['reset_ms']['p99']:.2f} ms"
+        allocated = f"{result['allocated_kib_per_reset']['p50']:.0f} KiB allocated"
+    else:
+        tick = result['tick_ms']
+        timing = (
+            f"{result['ticks_per_second']:.1f} ticks/s, tick p50/p95/p99 "
+            f"{tick['p50']:.2f}/{tick['p95']:.2f}/{tick['p99']:.2f} ms"
+        )
+        if 'render_ms' in result:
+            timing += f", render p95 {result['render_ms']['p95']:.2f} ms"
+        allocated = f"{result['allocated_kib_per_tick']['p50']:.0f} KiB allocated"
+        phases = [
+            f"{phase} {result[f'allocated_kib_per_{phase}']['p50']:.0f}"
+            for phase in ('update', 'targeting', 'render') if f'allocated_kib_per_{phase}' in result
+        ]
+        if phases:
+            allocated += f" ({', '.join(phases)})"
+    return f"{name}: {timing}, {allocated}, peak RSS {result['peak_rss_mib']:.0f} MiB"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the seeded SynthLife benchmark scenarios.")
+    parser.add_argument('--scenarios', nargs='*', choices=list(SCENARIOS), default=list(SCENARIOS),
+                        help="scenarios to run (default: all)")
+    parser.add_argument('--output', default='benchmark_results.json', help="file the results are written to")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="results to compare against (default: %(default)s)")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help="fraction a metric may be worse than the baseline (default: %(default)s)")
+    parser.add_argument('--update-baseline', action='store_true', help="store the results as the new baseline")
+    parser.add_argument('--no-render', action='store_true', help="skip the rendering measurements")
+    parser.add_argument('--repeat', type=int, default=REPEATS,
+                        help="runs of every scenario, of which the best is kept (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    results = {'seed': BENCHMARK_SEED, 'python': sys.version.split()[0], 'repeat': args.repeat, 'scenarios': {}}
+    for name in args.scenarios:
+        runs = []
+        for _ in range(args.repeat):
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                runs.append(executor.submit(run_scenario, name, not args.no_render).result())
+        result = best_run(runs)
+        results['scenarios'][name] = result
+        print(describe(name, result), flush=True)
+
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2)
+    if args.update_baseline:
+        # Scenarios that were not run keep their old baseline
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as baseline_file:
+                baseline = json.load(baseline_file)
+            results = dict(results, scenarios=dict(baseline['scenarios'], **results['scenarios']))
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f"Stored the results as the baseline in {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline {args.baseline} to compare with; store one with --update-baseline")
+        return 0
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    if args.repeat < baseline.get('repeat', 1):
+        print(f"The baseline kept the best of {baseline['repeat']} runs; with fewer, a busy machine may show regressions")
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"No metric is more than {args.tolerance:.0%} worse than {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+import csv
+import json
+
+# Ticks between two samples of a history
+HISTORY_INTERVAL = 1
+
+# Values sampled for every life type
+HISTORY_COLUMNS = ('count', 'energy', 'average_energy')
+
+
+class PopulationHistory:
+    """
+    Time series of every life type's count, total energy and average energy,
+    one sample every interval ticks. A Simulation records into it by setting
+    its history attribute; the samples are read from the world's running
+    totals, so a sample costs the same whatever the population.
+    """
+
+    def __init__(self, interval=HISTORY_INTERVAL):
+        self.interval = interval
+        self.ticks = []
+        # {life_type: {column: [value per sample]}}, filled in as types are first seen
+        self.series = {}
+
+    def capture(self, sim):
+        if sim.tick % self.interval:
+            return
+        self.ticks.append(sim.tick)
+        samples = len(self.ticks)
+        for life_type, stats in sim.stats.items():
+            series = self.series.get(life_type)
+            if series is None:
+                # A type seen late starts with zeros for the samples it missed
+                series = self.series[life_type] = {column: [0] * (samples - 1) for column in HISTORY_COLUMNS}
+            series['count'].append(stats.count)
+            series['energy'].append(stats.energy)
+            series['average_energy'].append(stats.average_energy)
+
+    def rows(self):
+        # One {'tick', 'A_count', 'A_energy', ...} row per sample
+        for index, tick in enumerate(self.ticks):
+            row = {'tick': tick}
+            for life_type, series in self.series.items():
+                for column in HISTORY_COLUMNS:
+                    row[f"{life_type}_{column}"] = series[column][index]
+            yield row
+
+    def save(self, path):
+        """
+        Write the history to a JSON file, or a CSV file with one row per
+        sample if path ends in .csv.
+        """
+        if path.endswith('.csv'):
+            fieldnames = ['tick'] + [
+                f"{life_type}_{column}" for life_type in self.series for column in HISTORY_COLUMNS
+            ]
+            with open(path, 'w', newline='') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+                writer.writeheader()
+                writer.writerows(self.rows())
+        else:
+            with open(path, 'w') as jsonfile:
+                json.dump({'interval': self.interval, 'ticks': self.ticks, 'series': self.series}, jsonfile)
@@ -0,0 +1,200 @@
+import math
+from itertools import islice
+
+# Cells with at least this many plants are checked as a whole by within()
+WHOLE_CELL_MIN_PLANTS = 8
+
+# Bounds that let every plant through
+UNBOUNDED = (-math.inf, -math.inf, math.inf, math.inf)
+
+
+class PlantField:
+    """
+    Plants kept in a dense list for drawing and bucketed in a fine grid for
+    range queries. Adding and removing a plant are O(1), and the nearest plant
+    is found by searching outward ring by ring, so queries stay cheap even
+    with 100k plants. Plants need a fixed position and get a slot attribute.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        # Dense list of plants; a removed plant's slot is filled by the last one
+        self.plants = []
+        # (cell_x, cell_y) -> insertion-ordered dict used as a set of plants
+        self.cells = {}
+        # Plants added and removed since the last take_changes(), kept once watch() was called
+        self.changes = None
+
+    def __len__(self):
+        return len(self.plants)
+
+    def __iter__(self):
+        return iter(self.plants)
+
+    def cell_of(self, position):
+        return (math.floor(position[0] / self.cell_size), math.floor(position[1] / self.cell_size))
+
+    def add(self, plant):
+        plant.slot = len(self.plants)
+        self.plants.append(plant)
+        cell = self.cell_of(plant.position)
+        bucket = self.cells.get(cell)
+        if bucket is None:
+            bucket = self.cells[cell] = {}
+        bucket[plant] = None
+        if self.changes is not None:
+            self.changes.append((plant, True))
+
+    def remove(self, plant):
+        slot = plant.slot
+        if slot is None:
+            return
+        last = self.plants.pop()
+        if last is not plant:
+            self.plants[slot] = last
+            last.slot = slot
+        plant.slot = None
+        cell = self.cell_of(plant.position)
+        bucket = self.cells[cell]
+        del bucket[plant]
+        if not bucket:
+            del self.cells[cell]
+        if self.changes is not None:
+            self.changes.append((plant, False))
+
+    def clear(self):
+        for plant in self.plants:
+            plant.slot = None
+        if self.changes is not None:
+            self.changes.extend((plant, False) for plant in self.plants)
+        self.plants.clear()
+        self.cells.clear()
+
+    def watch(self):
+        # Start recording changes, e.g. for a display that draws plants incrementally
+        self.changes = []
+
+    def take_changes(self):
+        """
+        Return the (plant, added) pairs recorded since the last call, oldest
+        first, and start a new record.
+        """
+        changes = self.changes
+        self.changes = []
+        return changes
+
+    def nearest(self, position, radius, bounds=UNBOUNDED):
+        """
+        Return the plant closest to position within radius and inside bounds,
+        or None. bounds is (min_x, min_y, max_x, max_y), with the max edges
+        excluded.
+        """
+        px, py = position
+        min_x, min_y, max_x, max_y = bounds
+        cell_size = self.cell_size
+        cells = self.cells
+        center_x, center_y = self.cell_of(position)
+        limit = radius * radius
+        # Distance from position to the edges of its own cell
+        edge = min(
+            px - center_x * cell_size,
+            (center_x + 1) * cell_size - px,
+            py - center_y * cell_size,
+            (center_y + 1) * cell_size - py,
+        )
+        best = None
+        best_distance = math.inf
+        for ring in range(int(radius // cell_size) + 2):
+            # No plant in this ring is closer than the edge of the ring inside it
+            if ring > 0:
+                gap = edge + (ring - 1) * cell_size
+                if gap * gap > min(best_distance, limit):
+                    break
+            for cell in ring_cells(center_x, center_y, ring):
+                bucket = cells.get(cell)
+                if not bucket:
+                    continue
+                # Skip cells lying completely outside the bounds
+                cell_x = cell[0] * cell_size
+                cell_y = cell[1] * cell_size
+                if cell_x >= max_x or cell_x + cell_size <= min_x or cell_y >= max_y or cell_y + cell_size <= min_y:
+                    continue
+                for plant in bucket:
+                    x, y = plant.position
+                    if not (min_x <= x < max_x and min_y <= y < max_y):
+                        continue
+                    dx = x - px
+                    dy = y - py
+                    distance = dx * dx + dy * dy
+                    if distance <= limit and distance < best_distance:
+                        best = plant
+                        best_distance = distance
+        return best
+
+    def within(self, position, radius, bounds=UNBOUNDED):
+        """
+        Return groups of the plants within radius of position and inside
+        bounds, as a list of sized iterables. Crowded cells lying completely
+        inside both are returned as they are, so counting the plants in range
+        costs one len() per such cell instead of one distance test per plant.
+        """
+        px, py = position
+        min_x, min_y, max_x, max_y = bounds
+        cell_size = self.cell_size
+        cells = self.cells
+        limit = radius * radius
+        first_x, first_y = self.cell_of((px - radius, py - radius))
+        last_x, last_y = self.cell_of((px + radius, py + radius))
+        found = []
+        groups = [found]
+        for cx in range(first_x, last_x + 1):
+            for cy in range(first_y, last_y + 1):
+                bucket = cells.get((cx, cy))
+                if not bucket:
+                    continue
+                if len(bucket) >= WHOLE_CELL_MIN_PLANTS:
+                    cell_x = cx * cell_size
+                    cell_y = cy * cell_size
+                    far_x = max(px - cell_x, cell_x + cell_size - px)
+                    far_y = max(py - cell_y, cell_y + cell_size - py)
+                    if (
+                        far_x * far_x + far_y * far_y <= limit
+                        and min_x <= cell_x and cell_x + cell_size <= max_x
+                        and min_y <= cell_y and cell_y + cell_size <= max_y
+                    ):
+                        groups.append(bucket)
+                        continue
+                for plant in bucket:
+                    x, y = plant.position
+                    dx = x - px
+                    dy = y - py
+                    if dx * dx + dy * dy <= limit and min_x <= x < max_x and min_y <= y < max_y:
+                        found.append(plant)
+        return groups
+
+
+# Function to pick the plant at a given index across groups returned by within()
+def pick_from_groups(groups, index):
+    for group in groups:
+        if index < len(group):
+            return next(islice(group, index, None))
+        index -= len(group)
+    raise IndexError('plant index out of range')
+
+
+# Function to list the cells at Chebyshev distance ring from a center cell
+def ring_cells(center_x, center_y, ring):
+    if ring == 0:
+        return [(center_x, center_y)]
+    top = center_y - ring
+    bottom = center_y + ring
+    left = center_x - ring
+    right = center_x + ring
+    cells = []
+    for x in range(left, right + 1):
+        cells.append((x, top))
+        cells.append((x, bottom))
+    for y in range(top + 1, bottom):
+        cells.append((left, y))
+        cells.append((right, y))
+    return cells
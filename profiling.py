@@ -0,0 +1,193 @@
+import csv
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+from types import MethodType
+
+from simulation import LifeForm, Simulation
+
+# Ticks and frames the rolling percentiles are taken over
+PROFILE_WINDOW = 600
+
+# Phases of a tick, in milliseconds. 'plants' to 'recorder' follow each other through the tick;
+# the phases after 'recorder' run inside 'life_forms' or 'contact_stage' and are included in their time
+TICK_PHASES = (
+    'tick', 'plants', 'life_forms', 'contact_stage', 'cleanup', 'winner', 'recorder',
+    'find_target', 'group_centroid', 'boundaries', 'interact',
+)
+
+# Events counted per tick
+TICK_COUNTERS = ('life_form_count', 'targets_searched', 'distance_evaluations', 'contacts', 'births', 'deaths')
+
+# Phases of a viewer frame, in milliseconds; 'wait' is the frame rate limit and event handling,
+# 'simulation' all ticks run in the frame
+FRAME_PHASES = ('frame', 'wait', 'simulation', 'energy_metrics', 'draw', 'display')
+
+# LifeForm methods timed during a profiled tick, and the phase their time goes to
+TIMED_METHODS = {
+    'find_target': 'find_target',
+    'find_group_centroid': 'group_centroid',
+    'enforce_boundaries': 'boundaries',
+    'interact_with_target': 'interact',
+}
+
+# Methods counted during a profiled tick, and the counter each call adds to
+COUNTED_METHODS = {
+    (LifeForm, 'find_target'): 'targets_searched',
+    (LifeForm, 'distance_to'): 'distance_evaluations',
+    (LifeForm, 'interact_with_target'): 'contacts',
+    (Simulation, 'add_life_form'): 'births',
+    (Simulation, 'count_death'): 'deaths',
+}
+
+
+# Function to take the nearest-rank percentile of sorted values
+def _percentile(values, percent):
+    if not values:
+        return 0
+    index = min(len(values) - 1, max(0, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+# Function to summarize samples as their mean and p50/p95/p99
+def percentiles(samples):
+    values = sorted(samples)
+    return {
+        'mean': sum(values) / len(values) if values else 0,
+        'p50': _percentile(values, 50),
+        'p95': _percentile(values, 95),
+        'p99': _percentile(values, 99),
+    }
+
+
+class Profiler:
+    """
+    Phase times and event counts of the last PROFILE_WINDOW ticks and frames.
+    A Simulation is profiled by setting its profiler attribute; the viewer
+    adds its frames with frame_lap() and end_frame(). The methods of the
+    inner phases are wrapped on the profiled world and its life forms only,
+    and only for the duration of a profiled tick, so a world without a
+    profiler pays nothing but a few checks per tick. Times
+    include the profiler's own overhead, which makes the inner phases look a
+    little slower than they are.
+    """
+
+    def __init__(self, window=PROFILE_WINDOW):
+        self.window = window
+        self.ticks = 0
+        self.frames = 0
+        # Samples of every phase and counter, one per tick or frame, oldest first
+        self.samples = {name: deque(maxlen=window) for name in TICK_PHASES + TICK_COUNTERS + FRAME_PHASES}
+        # Seconds and counts of the tick and the frame in progress
+        self.tick_values = dict.fromkeys(TICK_PHASES + TICK_COUNTERS, 0)
+        self.frame_values = dict.fromkeys(FRAME_PHASES, 0)
+        self.tick_mark = None
+        self.frame_mark = time.perf_counter()
+        self.frame_start = self.frame_mark
+
+    @contextmanager
+    def tick(self, sim):
+        values = self.tick_values
+        for name in values:
+            values[name] = 0
+        instrumented = self._instrument(sim)
+        start = self.tick_mark = time.perf_counter()
+        try:
+            yield
+        finally:
+            values['tick'] = time.perf_counter() - start
+            for instance, names in instrumented:
+                for name in names:
+                    del instance.__dict__[name]
+        values['life_form_count'] = len(sim.life_forms)
+        samples = self.samples
+        for name in TICK_PHASES:
+            samples[name].append(values[name] * 1000)
+        for name in TICK_COUNTERS:
+            samples[name].append(values[name])
+        self.ticks += 1
+
+    def _instrument(self, sim):
+        """
+        Shadow the methods of the inner phases on the world and its life
+        forms with timing and counting wrappers, returning (instance, names)
+        pairs for the caller to remove again. The classes are left alone, so
+        other worlds, in this thread or another, run uninstrumented.
+        """
+        values = self.tick_values
+        perf_counter = time.perf_counter
+        wrappers = {LifeForm: {}, Simulation: {}}
+        # The world may be a subclass overriding the counted methods
+        classes = {LifeForm: LifeForm, Simulation: type(sim)}
+        for (owner, name), counter in COUNTED_METHODS.items():
+
+            def counted(instance, *args, method=getattr(classes[owner], name), counter=counter, **kwargs):
+                values[counter] += 1
+                return method(instance, *args, **kwargs)
+
+            wrappers[owner][name] = counted
+        for name, phase in TIMED_METHODS.items():
+
+            def timed(instance, *args, method=wrappers[LifeForm].get(name, getattr(LifeForm, name)), phase=phase, **kwargs):
+                start = perf_counter()
+                result = method(instance, *args, **kwargs)
+                values[phase] += perf_counter() - start
+                return result
+
+            wrappers[LifeForm][name] = timed
+
+        # Life forms born during the tick do not act until the next one, so the current ones are all that need wrapping
+        instrumented = []
+        for instance in [sim] + sim.life_forms:
+            owner = Simulation if instance is sim else LifeForm
+            for name, wrapper in wrappers[owner].items():
+                instance.__dict__[name] = MethodType(wrapper, instance)
+            instrumented.append((instance, wrappers[owner]))
+        return instrumented
+
+    def lap(self, phase):
+        # Time since the last lap of the tick in progress goes to phase
+        now = time.perf_counter()
+        self.tick_values[phase] += now - self.tick_mark
+        self.tick_mark = now
+
+    def frame_lap(self, phase):
+        # Time since the last lap of the frame in progress goes to phase
+        now = time.perf_counter()
+        self.frame_values[phase] += now - self.frame_mark
+        self.frame_mark = now
+
+    def end_frame(self):
+        now = time.perf_counter()
+        values = self.frame_values
+        values['frame'] = now - self.frame_start
+        for name in FRAME_PHASES:
+            self.samples[name].append(values[name] * 1000)
+            values[name] = 0
+        self.frame_start = self.frame_mark = now
+        self.frames += 1
+
+    def summary(self):
+        """
+        Return {name: {'mean', 'p50', 'p95', 'p99'}} over the window for
+        every phase (milliseconds) and counter (per tick) with samples.
+        """
+        return {name: percentiles(samples) for name, samples in self.samples.items() if samples}
+
+    def save(self, path):
+        """
+        Write the summary to a JSON file, or a CSV file if path ends in .csv.
+        """
+        summary = self.summary()
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(['name', 'unit', 'mean', 'p50', 'p95', 'p99'])
+                for name, stats in summary.items():
+                    unit = 'count' if name in TICK_COUNTERS else 'ms'
+                    writer.writerow([name, unit] + [round(stats[key], 4) for key in ('mean', 'p50', 'p95', 'p99')])
+        else:
+            with open(path, 'w') as jsonfile:
+                report = {'ticks': self.ticks, 'frames': self.frames, 'window': self.window, 'phases': summary}
+                json.dump(report, jsonfile, indent=2)
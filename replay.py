@@ -0,0 +1,442 @@
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_right
+
+from arena import build_arena
+from plants import PlantField
+from simulation import (
+    WIDTH,
+    HEIGHT,
+    HEADER_HEIGHT,
+    GAP_RATIO,
+    REGION_COLUMNS,
+    REGION_ROWS,
+    TICKS_PER_SECOND,
+    Plant,
+    Rect,
+    intern_genome,
+)
+
+# First bytes of every replay file, repeated at its very end
+MAGIC = b'SYNTHRPL'
+
+# Layout version, bumped whenever the layout changes
+VERSION = 1
+
+# Ticks between keyframes; every keyframe starts a separately compressed block
+KEYFRAME_TICKS = 10 * TICKS_PER_SECOND
+
+# Tick, life form count and plant count of a keyframe
+KEYFRAME = struct.Struct('<III')
+
+# Tick, then the counts of births, deaths, plant spawns, plants eaten, fights and escaped deltas
+TICK = struct.Struct('<IIIIIII')
+
+# Id, type, genome and top left corner of a life form
+LIFE_FORM = struct.Struct('<IBHhh')
+
+# Id and center of a plant
+PLANT = struct.Struct('<Ihh')
+
+# Id of a life form that died
+DEATH = struct.Struct('<I')
+
+# Two ids: an eaten plant and its eater, or two fighting life forms
+PAIR = struct.Struct('<II')
+
+# Position in the life form list and top left corner, for moves too long for a delta
+ESCAPE = struct.Struct('<Ihh')
+
+# Offset and length of the JSON index, right before the closing magic
+FOOTER = struct.Struct('<QI')
+
+# Eater id of plants removed by anything but a life form
+NO_EATER = 0xFFFFFFFF
+
+# Largest per-tick move stored as a delta
+MAX_DELTA = 127
+
+# Largest arena coordinate and number of life types the records above can hold
+MAX_COORDINATE = 32767
+MAX_LIFE_TYPES = 256
+
+
+class ReplayRecorder:
+    """
+    Records a Simulation into a replay file while it runs. Every tick adds the
+    world's events (births, deaths, plant spawns, plants eaten and fights)
+    and the moves of all life forms as one byte per axis. Every keyframe_ticks
+    ticks a keyframe with the full state starts a new compressed block, so a
+    replay can be entered at any keyframe. Positions are the drawn integer
+    corners, so the replay shows exactly what the viewer would have.
+    """
+
+    def __init__(self, sim, path, keyframe_ticks=KEYFRAME_TICKS):
+        arena = sim.arena
+        if max(arena.right, arena.bottom) > MAX_COORDINATE:
+            raise ValueError(f"arenas larger than {MAX_COORDINATE} pixels cannot be recorded")
+        if len(sim.life_types) > MAX_LIFE_TYPES:
+            raise ValueError(f"games with more than {MAX_LIFE_TYPES} life types cannot be recorded")
+        self.path = path
+        self.keyframe_ticks = keyframe_ticks
+        self.file = open(f"{path}.tmp", 'wb')
+        self.file.write(MAGIC)
+        self.offset = len(MAGIC)
+
+        self.first_tick = sim.tick
+        self.sim = sim
+        self.type_ids = {life_type: type_id for type_id, life_type in enumerate(sim.life_types)}
+        self.genome_ids = {}
+        self.next_id = 0
+        # Ids of living life forms and plants, and the last recorded corner of each life form
+        self.life_form_ids = {}
+        self.plant_ids = {}
+        self.positions = {}
+        # (first tick, offset, length) of every block written
+        self.blocks = []
+
+        self.start_block(sim)
+        sim.events = []
+        sim.recorder = self
+
+    def new_id(self):
+        self.next_id += 1
+        return self.next_id
+
+    def genome_id(self, genome):
+        return self.genome_ids.setdefault(genome, len(self.genome_ids))
+
+    def pack_life_form(self, life_form):
+        life_form_id = self.life_form_ids.get(life_form)
+        if life_form_id is None:
+            life_form_id = self.life_form_ids[life_form] = self.new_id()
+        rect = life_form.rect
+        self.positions[life_form] = (rect.x, rect.y)
+        return LIFE_FORM.pack(
+            life_form_id, self.type_ids[life_form.life_type], self.genome_id(life_form.genome), rect.x, rect.y,
+        )
+
+    def pack_plant(self, plant):
+        plant_id = self.plant_ids[plant] = self.new_id()
+        return PLANT.pack(plant_id, *plant.position)
+
+    def start_block(self, sim):
+        # A keyframe holds the full state, in update order for the life forms
+        self.block_tick = sim.tick
+        parts = [KEYFRAME.pack(sim.tick, len(sim.life_forms), len(sim.plants))]
+        parts.extend(self.pack_life_form(life_form) for life_form in sim.life_forms)
+        parts.extend(
+            PLANT.pack(self.plant_ids[plant], *plant.position) if plant in self.plant_ids else self.pack_plant(plant)
+            for plant in sim.plants
+        )
+        self.block = parts
+
+    def flush_block(self):
+        data = zlib.compress(b''.join(self.block))
+        self.file.write(data)
+        self.blocks.append((self.block_tick, self.offset, len(data)))
+        self.offset += len(data)
+        self.block = None
+
+    def capture(self, sim):
+        """
+        Record the tick the simulation has just finished.
+        """
+        events = sim.events
+        sim.events = []
+
+        births = []
+        deaths = []
+        spawns = []
+        eaten = []
+        fights = []
+        dead = []
+        life_form_ids = self.life_form_ids
+        for event in events:
+            kind = event[0]
+            if kind == 'fight':
+                fights.append(PAIR.pack(life_form_ids[event[1]], life_form_ids[event[2]]))
+            elif kind == 'eat':
+                eater = life_form_ids[event[2]] if event[2] is not None else NO_EATER
+                eaten.append(PAIR.pack(self.plant_ids.pop(event[1]), eater))
+            elif kind == 'plant':
+                spawns.append(self.pack_plant(event[1]))
+            elif kind == 'birth':
+                births.append(self.pack_life_form(event[1]))
+            elif kind == 'death':
+                deaths.append(DEATH.pack(life_form_ids[event[1]]))
+                dead.append(event[1])
+        # Life forms are only forgotten now, as later events of this tick may still name them
+        for life_form in dead:
+            del life_form_ids[life_form]
+            del self.positions[life_form]
+
+        # Moves in update order; the replay derives the same order from births and deaths
+        deltas = array('b')
+        escapes = []
+        positions = self.positions
+        for index, life_form in enumerate(sim.life_forms):
+            rect = life_form.rect
+            x = rect.x
+            y = rect.y
+            last_x, last_y = positions[life_form]
+            dx = x - last_x
+            dy = y - last_y
+            if -MAX_DELTA <= dx <= MAX_DELTA and -MAX_DELTA <= dy <= MAX_DELTA:
+                deltas.append(dx)
+                deltas.append(dy)
+            else:
+                deltas.append(0)
+                deltas.append(0)
+                escapes.append(ESCAPE.pack(index, x, y))
+            positions[life_form] = (x, y)
+
+        block = self.block
+        block.append(TICK.pack(
+            sim.tick, len(births), len(deaths), len(spawns), len(eaten), len(fights), len(escapes),
+        ))
+        block.extend(births)
+        block.extend(deaths)
+        block.extend(spawns)
+        block.extend(eaten)
+        block.extend(fights)
+        block.append(deltas.tobytes())
+        block.extend(escapes)
+
+        if sim.tick - self.block_tick >= self.keyframe_ticks and not sim.finished:
+            self.flush_block()
+            self.start_block(sim)
+
+    def close(self):
+        """
+        Write the last block and the index, and stop recording. The replay
+        file only appears once it is complete.
+        """
+        sim = self.sim
+        sim.events = None
+        sim.recorder = None
+        self.flush_block()
+
+        index = {
+            'version': VERSION,
+            'first_tick': self.first_tick,
+            'last_tick': sim.tick,
+            'keyframe_ticks': self.keyframe_ticks,
+            'winner_type': sim.winner_type,
+            'life_type_parameters': sim.life_type_parameters,
+            'arena': [sim.arena.right, sim.arena.bottom, sim.arena.columns, sim.arena.rows],
+            'plant_cell_size': sim.plants.cell_size,
+            'genomes': [list(genome.pixels) for genome in self.genome_ids],
+            'examples': {
+                life_type: self.genome_id(life_form.genome)
+                for life_type, life_form in sim.life_form_examples.items()
+            },
+            'blocks': self.blocks,
+            'byteorder': sys.byteorder,
+        }
+        index_bytes = json.dumps(index).encode()
+        self.file.write(index_bytes)
+        self.file.write(FOOTER.pack(self.offset, len(index_bytes)))
+        self.file.write(MAGIC)
+        self.file.close()
+        os.replace(f"{self.path}.tmp", self.path)
+
+
+class ReplayLifeForm:
+    """
+    What a replay knows of a life form: enough to draw it.
+    """
+    __slots__ = ('key', 'life_type', 'genome', 'attributes', 'rect')
+
+    def __init__(self, key, life_type, genome, x=0, y=0):
+        self.key = key
+        self.life_type = life_type
+        self.genome = genome
+        self.attributes = genome.attributes
+        self.rect = Rect(*genome.size)
+        self.rect.x = x
+        self.rect.y = y
+
+
+class Replay:
+    """
+    A recorded game held in memory. Its state at any tick is rebuilt from the
+    keyframe before it and then moved forward one tick at a time, without
+    running any of the simulation. The state has the attributes the viewer's
+    drawing code reads from a Simulation: arena, plants, life_forms,
+    life_form_examples and population.
+    """
+
+    def __init__(self, data):
+        if data[:len(MAGIC)] != MAGIC or data[-len(MAGIC):] != MAGIC:
+            raise ValueError("not a complete SynthLife replay")
+        index_offset, index_length = FOOTER.unpack_from(data, len(data) - len(MAGIC) - FOOTER.size)
+        index = json.loads(data[index_offset:index_offset + index_length])
+        if index['version'] != VERSION:
+            raise ValueError(f"unsupported replay version {index['version']}")
+        if index['byteorder'] != sys.byteorder:
+            raise ValueError("replay was recorded on a machine with another byte order")
+
+        self.data = data
+        self.first_tick = index['first_tick']
+        self.last_tick = index['last_tick']
+        self.winner_type = index['winner_type']
+        self.life_type_parameters = index['life_type_parameters']
+        # Type ids number the life types in the order of their parameters
+        self.life_types = list(self.life_type_parameters)
+        self.plant_cell_size = index['plant_cell_size']
+        self.blocks = index['blocks']
+        self.block_ticks = [tick for tick, _, _ in self.blocks]
+        self.genomes = [intern_genome(pixels) for pixels in index['genomes']]
+        # Replays from before arenas could be resized hold the default one
+        width, height, columns, rows = index.get('arena', (WIDTH, HEIGHT, REGION_COLUMNS, REGION_ROWS))
+        self.arena = build_arena(width, height, HEADER_HEIGHT, GAP_RATIO, columns, rows)
+        self.life_form_examples = {
+            life_type: ReplayLifeForm(0, life_type, self.genomes[genome])
+            for life_type, genome in index['examples'].items()
+        }
+        # Nothing is loaded until the first seek
+        self.tick = None
+        self.block_number = None
+        self.seek(self.first_tick)
+
+    def load_block(self, number):
+        _, offset, length = self.blocks[number]
+        self.block_number = number
+        self.block = zlib.decompress(self.data[offset:offset + length])
+        tick, life_form_count, plant_count = KEYFRAME.unpack_from(self.block, 0)
+        self.offset = KEYFRAME.size
+        return tick, life_form_count, plant_count
+
+    def seek(self, tick):
+        """
+        Rebuild the state at the given tick, clamped to the recorded ones.
+        """
+        tick = min(max(tick, self.first_tick), self.last_tick)
+        number = bisect_right(self.block_ticks, tick) - 1
+        # Moving forward within the current block needs no keyframe
+        if number != self.block_number or tick < self.tick:
+            self.load_keyframe(number)
+        while self.tick < tick:
+            self.advance()
+
+    def load_keyframe(self, number):
+        self.tick, life_form_count, plant_count = self.load_block(number)
+        block = self.block
+        offset = self.offset
+        self.life_forms = []
+        self.life_forms_by_key = {}
+        self.population = dict.fromkeys(self.life_types, 0)
+        for key, type_id, genome, x, y in LIFE_FORM.iter_unpack(
+            block[offset:offset + life_form_count * LIFE_FORM.size]
+        ):
+            self.add_life_form(ReplayLifeForm(key, self.life_types[type_id], self.genomes[genome], x, y))
+        offset += life_form_count * LIFE_FORM.size
+        # A new plant field, so a display knows to draw all plants again
+        self.plants = PlantField(self.plant_cell_size)
+        self.plants_by_key = {}
+        for key, x, y in PLANT.iter_unpack(block[offset:offset + plant_count * PLANT.size]):
+            self.add_plant(key, x, y)
+        self.offset = offset + plant_count * PLANT.size
+        self.births = []
+        self.deaths = []
+        self.fights = []
+
+    def add_life_form(self, life_form):
+        self.life_forms.append(life_form)
+        self.life_forms_by_key[life_form.key] = life_form
+        self.population[life_form.life_type] += 1
+
+    def add_plant(self, key, x, y):
+        plant = Plant((x, y))
+        self.plants_by_key[key] = plant
+        self.plants.add(plant)
+
+    def advance(self):
+        """
+        Move the state forward by one tick. Returns False at the end of the
+        replay.
+        """
+        if self.tick >= self.last_tick:
+            return False
+        if self.offset >= len(self.block):
+            # The next block's keyframe repeats the state we already have
+            _, life_form_count, plant_count = self.load_block(self.block_number + 1)
+            self.offset += life_form_count * LIFE_FORM.size + plant_count * PLANT.size
+
+        block = self.block
+        offset = self.offset
+        self.tick, births, deaths, spawns, eaten, fights, escapes = TICK.unpack_from(block, offset)
+        offset += TICK.size
+
+        self.births = []
+        for _ in range(births):
+            key, type_id, genome, x, y = LIFE_FORM.unpack_from(block, offset)
+            offset += LIFE_FORM.size
+            self.births.append(ReplayLifeForm(key, self.life_types[type_id], self.genomes[genome], x, y))
+
+        self.deaths = []
+        dead = set()
+        for _ in range(deaths):
+            key, = DEATH.unpack_from(block, offset)
+            offset += DEATH.size
+            dead.add(key)
+
+        for _ in range(spawns):
+            key, x, y = PLANT.unpack_from(block, offset)
+            offset += PLANT.size
+            self.add_plant(key, x, y)
+
+        for _ in range(eaten):
+            key, _ = PAIR.unpack_from(block, offset)
+            offset += PAIR.size
+            self.plants.remove(self.plants_by_key.pop(key))
+
+        # Fights are looked up once the newborns are known, as they may be attacked in their first tick
+        fight_keys = []
+        for _ in range(fights):
+            fight_keys.append(PAIR.unpack_from(block, offset))
+            offset += PAIR.size
+
+        # Same order as the simulation: survivors first, then this tick's surviving newborns
+        for life_form in self.births:
+            self.life_forms_by_key[life_form.key] = life_form
+        self.fights = [
+            (self.life_forms_by_key[first], self.life_forms_by_key[second]) for first, second in fight_keys
+        ]
+        if dead:
+            self.deaths = [self.life_forms_by_key.pop(key) for key in dead]
+            for life_form in self.deaths:
+                self.population[life_form.life_type] -= 1
+            self.life_forms = [life_form for life_form in self.life_forms if life_form.key not in dead]
+        for life_form in self.births:
+            self.population[life_form.life_type] += 1
+            if life_form.key not in dead:
+                self.life_forms.append(life_form)
+
+        count = 2 * len(self.life_forms)
+        deltas = array('b', block[offset:offset + count])
+        offset += count
+        for life_form, dx, dy in zip(self.life_forms, deltas[0::2], deltas[1::2]):
+            rect = life_form.rect
+            rect.x += dx
+            rect.y += dy
+        for _ in range(escapes):
+            index, x, y = ESCAPE.unpack_from(block, offset)
+            offset += ESCAPE.size
+            rect = self.life_forms[index].rect
+            rect.x = x
+            rect.y = y
+
+        self.offset = offset
+        return True
+
+
+# Function to load a replay file
+def load_replay(path):
+    with open(path, 'rb') as replay_file:
+        return Replay(replay_file.read())
@@ -0,0 +1,113 @@
+import argparse
+
+import pygame
+
+import synthlife
+from simulation import WIDTH, TICKS_PER_SECOND
+from replay import load_replay
+
+# Playback speeds the up and down keys step through, in multiples of real time
+SPEEDS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+
+# Ticks the left and right keys jump
+SEEK_TICKS = 10 * TICKS_PER_SECOND
+
+# Color of the marks drawn where life forms fought in the last tick
+FIGHT_COLOR = (255, 60, 60)
+
+
+# Function to draw the life types, their populations and the playback state over the header bar
+def draw_header(surface, replay, speed, paused):
+    render_text = synthlife.render_text
+    x_offset = 50
+    for life_type, life_form in replay.life_form_examples.items():
+        life_form_image = synthlife.get_life_form_image(life_form)
+        image_rect = life_form_image.get_rect()
+        image_rect.topleft = (x_offset, 10)
+        surface.blit(life_form_image, image_rect)
+        label = render_text(f"Type {life_type}: {replay.population[life_type]}")
+        surface.blit(label, (x_offset, image_rect.bottom + 5))
+        x_offset += image_rect.width + 150
+
+    status = f"Tick {replay.tick}/{replay.last_tick}  {speed:g}x"
+    if paused:
+        status += "  paused"
+    if replay.tick == replay.last_tick and replay.winner_type is not None:
+        status += f"  Winner: {replay.winner_type}"
+    status_text = render_text(status)
+    status_rect = status_text.get_rect()
+    status_rect.topright = (WIDTH - 20, 10)
+    surface.blit(status_text, status_rect)
+    help_text = render_text("Space pause, Left/Right seek, Up/Down speed", (160, 160, 160))
+    help_rect = help_text.get_rect()
+    help_rect.topright = (WIDTH - 20, status_rect.bottom + 5)
+    surface.blit(help_text, help_rect)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play back a recorded SynthLife game.")
+    parser.add_argument('replay', help="replay file to play")
+    parser.add_argument('--speed', type=float, default=1, help="playback speed in multiples of real time")
+    parser.add_argument('--start', type=int, default=0, metavar='TICK', help="tick to start playing from")
+    args = parser.parse_args(argv)
+
+    replay = load_replay(args.replay)
+    replay.seek(args.start)
+    synthlife.init_display()
+    pygame.display.set_caption(f"Synthetic Life Replay - {args.replay}")
+    screen = synthlife.screen
+    clock = synthlife.clock
+
+    speed = args.speed
+    paused = False
+    # Real time not yet turned into replayed ticks
+    lag = 0
+    tick_time = 1000 / TICKS_PER_SECOND
+
+    running = True
+    while running:
+        elapsed = clock.tick(synthlife.FPS)
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    running = False
+                elif event.key == pygame.K_SPACE:
+                    paused = not paused
+                elif event.key == pygame.K_RIGHT:
+                    replay.seek(replay.tick + SEEK_TICKS)
+                elif event.key == pygame.K_LEFT:
+                    replay.seek(replay.tick - SEEK_TICKS)
+                elif event.key == pygame.K_HOME:
+                    replay.seek(replay.first_tick)
+                elif event.key == pygame.K_END:
+                    replay.seek(replay.last_tick)
+                elif event.key == pygame.K_UP:
+                    speed = min((s for s in SPEEDS if s > speed), default=speed)
+                elif event.key == pygame.K_DOWN:
+                    speed = max((s for s in SPEEDS if s < speed), default=speed)
+
+        # Replay the ticks that fit in the real time since the last frame
+        if not paused:
+            lag += elapsed * speed
+            ticks = int(lag // tick_time)
+            lag -= ticks * tick_time
+            for _ in range(ticks):
+                if not replay.advance():
+                    lag = 0
+                    break
+
+        synthlife.draw_background(screen, replay)
+        synthlife.draw_life_forms(screen, replay)
+        for first, second in replay.fights:
+            pygame.draw.circle(screen, FIGHT_COLOR, first.rect.center, 3)
+            pygame.draw.circle(screen, FIGHT_COLOR, second.rect.center, 3)
+        draw_header(screen, replay, speed, paused)
+        pygame.display.flip()
+
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from simulation import (
+    Simulation,
+    calculate_attributes,
+    crossover_pixels,
+    generate_random_pixels,
+    mutate_pixels,
+)
+from winners import WINNERS_DB, load_last_winning_parameters, append_winning_parameters
+
+# Candidate genomes evaluated per generation
+POPULATION_SIZE = 24
+
+# Best candidates carried over unchanged into the next generation
+ELITE_COUNT = 6
+
+# Fresh random genomes added to every generation
+IMMIGRANT_COUNT = 2
+
+# Matches each candidate plays against the champion
+MATCHES_PER_CANDIDATE = 4
+
+# Ticks after which an undecided match is scored by population share
+MATCH_TICKS = 4000
+
+# Ticks between checks whether a match is already decided
+CHECK_INTERVAL = 250
+
+# A side holding less than this share of the living life forms has clearly lost
+LOSING_SHARE = 0.1
+
+# Average match score a candidate needs to replace the champion
+PROMOTION_SCORE = 0.6
+
+# Winner archive the champions found are appended to
+CHAMPIONS_DB = 'search_champions.db'
+
+# Each side of a match takes two opposite quarters
+CANDIDATE_TYPES = ('A', 'D')
+CHAMPION_TYPES = ('B', 'C')
+
+
+# Function to play one match and return the candidate's score (0 to 1) and the ticks played
+def play_match(candidate, champion, seed, swap=False):
+    candidate_types, champion_types = CANDIDATE_TYPES, CHAMPION_TYPES
+    if swap:
+        candidate_types, champion_types = champion_types, candidate_types
+    life_type_parameters = {}
+    for life_types, pixels in ((candidate_types, candidate), (champion_types, champion)):
+        for life_type in life_types:
+            life_type_parameters[life_type] = {'pixels': list(pixels), 'attributes': calculate_attributes(pixels)}
+
+    sim = Simulation(life_type_parameters, seed=seed)
+    while not sim.finished and sim.tick < MATCH_TICKS:
+        sim.step(min(CHECK_INTERVAL, MATCH_TICKS - sim.tick))
+        candidate_count = sum(sim.population[life_type] for life_type in candidate_types)
+        total = sum(sim.population.values())
+        if not total:
+            break
+        # Stop as soon as one side is clearly beaten
+        share = candidate_count / total
+        if share < LOSING_SHARE:
+            return 0.0, sim.tick
+        if share > 1 - LOSING_SHARE:
+            return 1.0, sim.tick
+
+    if sim.winner_type is not None:
+        return (1.0 if sim.winner_type in candidate_types else 0.0), sim.tick
+    total = sum(sim.population.values())
+    if not total:
+        return 0.5, sim.tick
+    return sum(sim.population[life_type] for life_type in candidate_types) / total, sim.tick
+
+
+# Function to evaluate a candidate in a worker process
+def evaluate_candidate(candidate, champion, seeds, cutoff=0.0):
+    """
+    Play the candidate against the champion once per seed, alternating sides,
+    and return its average score, the ticks played and whether every match
+    was played. Play stops once the candidate can no longer reach cutoff even
+    by winning everything left; the matches not played count as lost.
+    """
+    total = 0.0
+    ticks = 0
+    for index, seed in enumerate(seeds):
+        if (total + len(seeds) - index) / len(seeds) < cutoff:
+            return total / len(seeds), ticks, False
+        score, played = play_match(candidate, champion, seed, swap=index % 2 == 1)
+        total += score
+        ticks += played
+    return total / len(seeds), ticks, True
+
+
+class GenomeSearch:
+    """
+    Evolves genomes against a champion. Every generation each candidate plays
+    a few short matches against the champion on a process pool, all
+    candidates on the same seeds. The best candidates are kept, mutated and
+    crossed over into the next generation, and a candidate scoring at least
+    PROMOTION_SCORE becomes the new champion, archived as life_type.
+    """
+
+    def __init__(
+        self,
+        champion=None,
+        life_type=CANDIDATE_TYPES[0],
+        population_size=POPULATION_SIZE,
+        elite_count=ELITE_COUNT,
+        matches=MATCHES_PER_CANDIDATE,
+        workers=None,
+        seed=None,
+        output=CHAMPIONS_DB,
+    ):
+        if elite_count < 1:
+            raise ValueError(f"the elite needs at least one candidate, not {elite_count}")
+        self.seed = seed if seed is not None else random.randrange(1 << 63)
+        self.rng = random.Random(self.seed)
+        self.champion = sorted(champion) if champion else sorted(generate_random_pixels(self.rng))
+        self.life_type = life_type
+        self.population_size = population_size
+        self.elite_count = min(elite_count, population_size)
+        self.matches = matches
+        self.workers = workers or os.cpu_count()
+        self.output = output
+
+        self.generation = 0
+        self.evaluated = 0
+        self.ticks = 0
+        # Lowest score of a candidate that played all its matches and still made the elite last generation
+        self.cutoff = 0.0
+
+    def match_seeds(self):
+        return [
+            random.Random(f"{self.seed}:{self.generation}:{match}").getrandbits(64)
+            for match in range(self.matches)
+        ]
+
+    def first_population(self):
+        # Variations of the champion and fresh random genomes
+        population = [mutate_pixels(self.champion, self.rng, self.rng.randint(1, 3)) for _ in range(self.population_size // 2)]
+        while len(population) < self.population_size:
+            population.append(sorted(generate_random_pixels(self.rng)))
+        return population
+
+    def next_population(self, elites):
+        population = list(elites)
+        seen = {tuple(pixels) for pixels in population}
+        while len(population) < self.population_size - IMMIGRANT_COUNT:
+            if len(elites) > 1 and self.rng.random() < 0.5:
+                child = crossover_pixels(*self.rng.sample(elites, 2), self.rng)
+                child = mutate_pixels(child, self.rng)
+            else:
+                child = mutate_pixels(self.rng.choice(elites), self.rng, self.rng.randint(1, 3))
+            if tuple(child) not in seen:
+                seen.add(tuple(child))
+                population.append(child)
+        while len(population) < self.population_size:
+            population.append(sorted(generate_random_pixels(self.rng)))
+        return population
+
+    def run(self, generations, report=print):
+        """
+        Run the given number of generations and return the champion's pixels.
+        """
+        start = time.perf_counter()
+        population = self.first_population()
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for _ in range(generations):
+                results = list(executor.map(
+                    evaluate_candidate, population, repeat(self.champion), repeat(self.match_seeds()),
+                    repeat(self.cutoff), chunksize=1,
+                ))
+                self.evaluated += len(population)
+                self.ticks += sum(ticks for _, ticks, _ in results)
+
+                ranked = sorted(zip((score for score, _, _ in results), population), key=lambda pair: -pair[0])
+                elites = [pixels for _, pixels in ranked[:self.elite_count]]
+                best_score, best = ranked[0]
+                # Cut-short candidates only have a lower bound; if they had to fill the elite, nobody is cut short next time
+                complete = sorted((score for score, _, played_all in results if played_all), reverse=True)
+                self.cutoff = complete[self.elite_count - 1] if len(complete) >= self.elite_count else 0.0
+
+                promoted = best_score >= PROMOTION_SCORE
+                if promoted:
+                    self.promote(best)
+
+                if report:
+                    elapsed = max(time.perf_counter() - start, 1e-9)
+                    report(
+                        f"generation {self.generation}: best {best_score:.2f}, elite cutoff {self.cutoff:.2f}"
+                        f"{', new champion' if promoted else ''} | {self.evaluated} genomes, "
+                        f"{self.evaluated / elapsed * 3600:.0f} genomes/h, {self.ticks / elapsed:.0f} ticks/s"
+                    )
+                self.generation += 1
+                population = self.next_population(elites)
+        return self.champion
+
+    def promote(self, pixels):
+        self.champion = pixels
+        # Scores against the old champion say nothing about the new one
+        self.cutoff = 0.0
+        if self.output:
+            append_winning_parameters(self.life_type, {'pixels': pixels, 'attributes': calculate_attributes(pixels)}, self.output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search for strong SynthLife genomes in parallel.")
+    parser.add_argument('--generations', type=int, default=50, help="number of generations")
+    parser.add_argument('--population', type=int, default=POPULATION_SIZE, help="candidates per generation")
+    parser.add_argument('--elite', type=int, default=ELITE_COUNT, help="candidates kept per generation")
+    parser.add_argument('--matches', type=int, default=MATCHES_PER_CANDIDATE, help="matches per candidate")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--seed', type=int, default=None, help="search seed")
+    parser.add_argument('--champion', default=WINNERS_DB,
+                        help="winner archive whose last winner is the starting champion (default: %(default)s)")
+    parser.add_argument('--output', default=CHAMPIONS_DB, help="winner archive new champions are appended to")
+    parser.add_argument('--life-type', default=None,
+                        help="life type new champions are archived as (default: the starting champion's)")
+    args = parser.parse_args(argv)
+
+    # The champion archive is only read; without one the search starts from a random champion
+    champion_type, champion_parameters = None, None
+    if os.path.exists(args.champion):
+        champion_type, champion_parameters, _ = load_last_winning_parameters(args.champion, read_only=True)
+    search = GenomeSearch(
+        champion=champion_parameters['pixels'] if champion_parameters else None,
+        life_type=args.life_type or champion_type or CANDIDATE_TYPES[0],
+        population_size=args.population,
+        elite_count=args.elite,
+        matches=args.matches,
+        workers=args.workers,
+        seed=args.seed,
+        output=args.output,
+    )
+    print(f"Search seed {search.seed}, {search.population_size} candidates x {search.matches} matches "
+          f"on {search.workers} workers")
+    search.run(args.generations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,624 @@
+import argparse
+import itertools
+import os
+import random
+import struct
+import time
+from multiprocessing import Pipe, Process
+from multiprocessing.shared_memory import SharedMemory
+
+from simulation import (
+    WIDTH,
+    HEIGHT,
+    REGION_COLUMNS,
+    REGION_ROWS,
+    NUM_EACH_LIFE_FORM,
+    MAX_LIFEFORMS_PER_TYPE,
+    MAX_LIFE_FORM_SIZE,
+    PLANT_RESPAWN_TICKS,
+    LifeForm,
+    Plant,
+    Simulation,
+)
+from snapshot import restore_snapshot, snapshot_bytes
+
+# Most shards of one game; ghost records address their shards in a 64-bit mask
+MAX_SHARDS = 64
+
+# Numbers of migrants, ghosts and effects at the start of an outbox
+OUTBOX_HEADER = struct.Struct('<III')
+
+# A life form handed to the shard owning the region it moved into: id, that shard, type, position,
+# direction, energy, reproduction cooldown and the id of the life form it targets (-1 for none)
+MIGRANT = struct.Struct('<qHHddddiq')
+
+# A life form near a border, mirrored to the shards whose regions it can reach: id, mask of those
+# shards, type, position, energy and reproduction cooldown
+GHOST = struct.Struct('<qQHdddi')
+
+# What a shard did to a ghost during a tick: id, the shard owning it, energy change and the
+# reproduction cooldown it was given (-1 for none)
+EFFECT = struct.Struct('<qHdi')
+
+# Smallest outbox, in bytes; outboxes grow to twice what a tick needs when they run out
+MIN_OUTBOX_SIZE = 1 << 16
+
+# Seconds between progress lines of the command line runner
+REPORT_INTERVAL = 5
+
+
+# Function to derive the seed of one shard's random stream from the game seed
+def shard_seed(seed, shard):
+    return random.Random(f"{seed}:shard:{shard}").getrandbits(64)
+
+
+class ShardWorld(Simulation):
+    """
+    The part of a game one worker process steps: the life forms and plants
+    in the regions of its shard, and ghosts of the life forms other shards
+    hold near the borders. Ghosts are in the life form index but not in
+    life_forms, so they are seen and touched but never updated here. The
+    coordinator decides the winner and where plants spawn, and sets
+    population to the whole game's at the start of every tick, while stats
+    only cover the shard's own life forms.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Ghosts by life form id, and the plant positions to spawn in the coming tick
+        self.ghosts = {}
+        self.plant_spawns = []
+        # Ids given to the life forms born here, set by the worker
+        self.ids = None
+
+    def add_life_form(self, life_form):
+        life_form.uid = next(self.ids)
+        super().add_life_form(life_form)
+
+    def count_death(self, life_form):
+        # A ghost's death is counted by its own shard once it hears of it
+        if self.ghosts.get(life_form.uid) is not life_form:
+            super().count_death(life_form)
+
+    def spawn_plant(self):
+        for position in self.plant_spawns:
+            self.add_plant(Plant(position))
+        self.plant_spawns = []
+
+    def check_winner(self):
+        pass
+
+
+class ShardWorker:
+    """
+    Runs in a worker process and steps one shard tick by tick. Between ticks
+    it writes what other shards need into its outbox in shared memory: the
+    life forms that moved into their regions, ghosts of its life forms near
+    their regions, and what it did to their ghosts. The next tick starts by
+    reading the other shards' outboxes. Outboxes alternate between two
+    buffers by tick, so one is never written while another shard reads it.
+    """
+
+    def __init__(self, shard, region_shards, snapshot, seed):
+        self.shard = shard
+        self.region_shards = region_shards
+        shards = max(region_shards) + 1
+        world = self.world = restore_snapshot(snapshot, seed, world_class=ShardWorld)
+        self.arena = world.arena
+        self.type_ids = {life_type: type_id for type_id, life_type in enumerate(world.life_types)}
+        # Ghosts are kept for everything the index queries of a life form can reach
+        self.margin = world.life_form_index.cell_size + MAX_LIFE_FORM_SIZE
+
+        # Life forms of the snapshot are numbered in its order, later ones per shard after them
+        world.ids = itertools.count(len(world.life_forms) + shard, shards)
+        own = []
+        for uid, life_form in enumerate(world.life_forms):
+            life_form.uid = uid
+            if self.owns(life_form.position):
+                own.append(life_form)
+            else:
+                world.life_form_index.remove(life_form)
+                world.stats[life_form.life_type].remove(life_form)
+                life_form.alive = False
+        world.life_forms = own
+        for plant in list(world.plants):
+            if not self.owns(plant.position):
+                world.plants.remove(plant)
+
+        # Ghosts that migrated away or were killed here in the last tick, kept as they are by the next refresh
+        self.departed = set()
+        self.killed = set()
+        # Effects on life forms that have moved on to another shard, passed on with the next outbox
+        self.forwarded = []
+        # Two outboxes written on alternate ticks, empty until then, and the other shards' outboxes attached so far
+        self.outboxes = [SharedMemory(create=True, size=MIN_OUTBOX_SIZE) for _ in range(2)]
+        self.attached = {}
+        self.last_peers = []
+        self.write_outbox([], [], self.halo())
+
+    def owns(self, position):
+        return self.region_shards[self.arena.region_of(position)] == self.shard
+
+    def outbox_names(self):
+        return [outbox.name for outbox in self.outboxes]
+
+    def halo_mask(self, position, region):
+        """
+        Return the mask of the other shards with a region within the margin
+        of position, which lies in region.
+        """
+        arena = self.arena
+        margin = self.margin
+        x, y = position
+        left, top, right, bottom = arena.region_boxes[region]
+        if x - left >= margin and right - x >= margin and y - top >= margin and bottom - y >= margin:
+            return 0
+        mask = 0
+        for row in range(arena.row_of(y - margin), arena.row_of(y + margin) + 1):
+            for column in range(arena.column_of(x - margin), arena.column_of(x + margin) + 1):
+                neighbor = row * arena.columns + column
+                shard = self.region_shards[neighbor]
+                if shard == self.shard or mask & (1 << shard):
+                    continue
+                left, top, right, bottom = arena.region_boxes[neighbor]
+                dx = max(left - x, 0, x - right)
+                dy = max(top - y, 0, y - bottom)
+                if dx * dx + dy * dy < margin * margin:
+                    mask |= 1 << shard
+        return mask
+
+    def halo(self):
+        # Ghost records of the life forms near other shards
+        records = []
+        region_of = self.arena.region_of
+        type_ids = self.type_ids
+        for life_form in self.world.life_forms:
+            mask = self.halo_mask(life_form.position, region_of(life_form.position))
+            if mask:
+                records.append(GHOST.pack(
+                    life_form.uid, mask, type_ids[life_form.life_type], life_form.position[0],
+                    life_form.position[1], life_form.energy, life_form.reproduction_cooldown,
+                ))
+        return records
+
+    def write_outbox(self, migrants, effects, ghosts):
+        data = b''.join(itertools.chain(
+            [OUTBOX_HEADER.pack(len(migrants), len(ghosts), len(effects))], migrants, ghosts, effects,
+        ))
+        parity = self.world.tick % 2
+        outbox = self.outboxes[parity]
+        if outbox.size < len(data):
+            # Shards still holding the old outbox keep their mapping until they see the new name
+            outbox.close()
+            outbox.unlink()
+            outbox = self.outboxes[parity] = SharedMemory(create=True, size=max(MIN_OUTBOX_SIZE, 2 * len(data)))
+        outbox.buf[:len(data)] = data
+
+    def read_outboxes(self, peers):
+        """
+        Return the migrants, ghosts and effects for this shard in the
+        outboxes named by peers, as lists of unpacked records.
+        """
+        migrants = []
+        ghosts = []
+        effects = []
+        bit = 1 << self.shard
+        for shard, name in enumerate(peers):
+            if shard == self.shard:
+                continue
+            outbox = self.attached.get((shard, name))
+            if outbox is None:
+                outbox = self.attached[shard, name] = SharedMemory(name)
+            buffer = outbox.buf
+            migrant_count, ghost_count, effect_count = OUTBOX_HEADER.unpack_from(buffer, 0)
+            offset = OUTBOX_HEADER.size
+            for offset in range(offset, offset + migrant_count * MIGRANT.size, MIGRANT.size):
+                record = MIGRANT.unpack_from(buffer, offset)
+                if record[1] == self.shard:
+                    migrants.append(record)
+            offset = OUTBOX_HEADER.size + migrant_count * MIGRANT.size
+            for offset in range(offset, offset + ghost_count * GHOST.size, GHOST.size):
+                record = GHOST.unpack_from(buffer, offset)
+                if record[1] & bit:
+                    ghosts.append((shard,) + record)
+            offset = OUTBOX_HEADER.size + migrant_count * MIGRANT.size + ghost_count * GHOST.size
+            for offset in range(offset, offset + effect_count * EFFECT.size, EFFECT.size):
+                record = EFFECT.unpack_from(buffer, offset)
+                if record[1] == self.shard:
+                    effects.append(record)
+
+        # Outboxes that were replaced are let go once both ticks' names have moved on
+        for key in [key for key in self.attached if key[1] not in peers and key[1] not in self.last_peers]:
+            self.attached.pop(key).close()
+        self.last_peers = peers
+        return migrants, ghosts, effects
+
+    def tick(self, spawns, population, peers):
+        """
+        Step the shard by one tick. Returns the change in every type's
+        population, the number of plants and the outbox names.
+        """
+        world = self.world
+        migrants, ghosts, effects = self.read_outboxes(peers)
+        world.population = dict(population)
+        agents = {life_form.uid: life_form for life_form in world.life_forms}
+        self.apply_effects(agents, effects)
+        self.refresh_ghosts(ghosts, {record[0] for record in migrants})
+        self.accept_migrants(agents, migrants)
+        world.plant_spawns = spawns
+
+        # What this tick does to the ghosts goes back to their shards
+        touched = {
+            uid: (ghost.energy, ghost.reproduction_cooldown) for uid, ghost in world.ghosts.items() if ghost.alive
+        }
+        world.advance()
+        effects = self.forwarded
+        self.forwarded = []
+        self.killed = set()
+        for uid, (energy, cooldown) in touched.items():
+            ghost = world.ghosts[uid]
+            energy_change = ghost.energy - energy
+            # Ghosts are counted by their own shards
+            world.stats[ghost.life_type].energy -= energy_change
+            new_cooldown = ghost.reproduction_cooldown if ghost.reproduction_cooldown != cooldown else -1
+            if energy_change or new_cooldown >= 0:
+                effects.append(EFFECT.pack(uid, ghost.owner, energy_change, new_cooldown))
+            if not ghost.alive:
+                self.killed.add(uid)
+
+        migrants = self.emigrate()
+        self.write_outbox(migrants, effects, self.halo())
+        changes = [world.population[life_type] - population[life_type] for life_type in world.life_types]
+        return changes, len(world.plants), self.outbox_names()
+
+    def apply_effects(self, agents, effects):
+        world = self.world
+        for uid, _, energy_change, cooldown in effects:
+            life_form = agents.get(uid)
+            if life_form is None:
+                # Gone to another shard since; its effects follow it there
+                ghost = world.ghosts.get(uid)
+                if ghost is not None:
+                    self.forwarded.append(EFFECT.pack(uid, ghost.owner, energy_change, cooldown))
+                continue
+            if not life_form.alive:
+                continue
+            life_form.energy += energy_change
+            world.stats[life_form.life_type].energy += energy_change
+            if cooldown >= 0:
+                life_form.reproduction_cooldown = cooldown
+            if life_form.energy <= 0:
+                life_form.die(world)
+
+    def refresh_ghosts(self, records, arriving):
+        world = self.world
+        index = world.life_form_index
+        ghosts = world.ghosts
+        seen = set()
+        for owner, uid, _, type_id, x, y, energy, cooldown in records:
+            seen.add(uid)
+            ghost = ghosts.get(uid)
+            if ghost is None:
+                ghost = self.new_life_form(uid, type_id, x, y)
+                ghosts[uid] = ghost
+                index.insert(ghost, ghost.rect.center)
+            else:
+                ghost.position[0] = x
+                ghost.position[1] = y
+                ghost.rect.center = (int(x), int(y))
+                index.move(ghost, ghost.rect.center)
+                # A ghost killed here stays dead until its shard has heard of it
+                ghost.alive = uid not in self.killed
+            ghost.owner = owner
+            ghost.energy = energy
+            ghost.reproduction_cooldown = cooldown
+        # Ghosts about to arrive as migrants are kept for accept_migrants to take over
+        seen |= arriving | self.departed
+        for uid in [uid for uid in ghosts if uid not in seen]:
+            ghost = ghosts.pop(uid)
+            ghost.alive = False
+            index.remove(ghost)
+        self.departed = set()
+
+    def accept_migrants(self, agents, records):
+        world = self.world
+        index = world.life_form_index
+        targets = []
+        for uid, _, type_id, x, y, direction, energy, cooldown, target in records:
+            life_form = world.ghosts.pop(uid, None)
+            if life_form is None:
+                life_form = self.new_life_form(uid, type_id, x, y)
+                index.insert(life_form, life_form.rect.center)
+            else:
+                # The ghost becomes the life form, so whatever targets it here still does
+                life_form.position[0] = x
+                life_form.position[1] = y
+                life_form.rect.center = (int(x), int(y))
+                index.move(life_form, life_form.rect.center)
+                life_form.alive = True
+                life_form.target = None
+            life_form.direction = direction
+            life_form.energy = energy
+            life_form.reproduction_cooldown = cooldown
+            # Its moves elsewhere were not counted in this world's travel
+            life_form.search_travel = 0.0
+            world.life_forms.append(life_form)
+            world.stats[life_form.life_type].add(life_form)
+            agents[uid] = life_form
+            targets.append((life_form, target))
+        # Targets are looked up once every migrant is in, as migrants may target each other
+        for life_form, target in targets:
+            if target >= 0:
+                life_form.target = agents.get(target) or world.ghosts.get(target)
+
+    def new_life_form(self, uid, type_id, x, y):
+        world = self.world
+        life_type = world.life_types[type_id]
+        life_form = LifeForm(life_type, position=[x, y], genome=world.genomes[life_type], rng=world.rng)
+        life_form.uid = uid
+        return life_form
+
+    def emigrate(self):
+        """
+        Hand the life forms that left the shard's regions to their new
+        shards. Each stays behind as a ghost until the next refresh, so what
+        was chasing it here keeps doing so.
+        """
+        world = self.world
+        region_of = self.arena.region_of
+        type_ids = self.type_ids
+        migrants = []
+        own = []
+        for life_form in world.life_forms:
+            shard = self.region_shards[region_of(life_form.position)]
+            if shard == self.shard:
+                own.append(life_form)
+                continue
+            target = life_form.target
+            target_uid = target.uid if isinstance(target, LifeForm) and target.alive else -1
+            migrants.append(MIGRANT.pack(
+                life_form.uid, shard, type_ids[life_form.life_type], life_form.position[0], life_form.position[1],
+                life_form.direction, life_form.energy, life_form.reproduction_cooldown, target_uid,
+            ))
+            life_form.owner = shard
+            world.stats[life_form.life_type].remove(life_form)
+            world.ghosts[life_form.uid] = life_form
+            self.departed.add(life_form.uid)
+        world.life_forms = own
+        return migrants
+
+    def winning_parameters(self, life_type):
+        for life_form in self.world.life_forms:
+            if life_form.life_type == life_type:
+                return {'pixels': list(life_form.pixels), 'attributes': life_form.attributes}
+        return None
+
+    def life_form_records(self):
+        # Life forms on their way to another shard are still listed here
+        world = self.world
+        departed = [world.ghosts[uid] for uid in sorted(self.departed)]
+        return [
+            (life_form.uid, life_form.life_type, life_form.position[0], life_form.position[1], life_form.energy)
+            for life_form in world.life_forms + departed
+        ]
+
+    def close(self):
+        for outbox in self.attached.values():
+            outbox.close()
+        for outbox in self.outboxes:
+            outbox.close()
+            outbox.unlink()
+
+
+# Function run by every worker process: build the shard from the snapshot, then serve the coordinator
+def run_shard(connection, shard, region_shards, snapshot_name, snapshot_size, seed):
+    snapshot = SharedMemory(snapshot_name)
+    with snapshot.buf[:snapshot_size] as buffer:
+        worker = ShardWorker(shard, region_shards, buffer, seed)
+    snapshot.close()
+    connection.send(worker.outbox_names())
+    try:
+        while True:
+            command, *args = connection.recv()
+            if command == 'tick':
+                connection.send(worker.tick(*args))
+            elif command == 'winner':
+                connection.send(worker.winning_parameters(*args))
+            elif command == 'life_forms':
+                connection.send(worker.life_form_records())
+            else:
+                break
+    finally:
+        worker.close()
+        connection.close()
+
+
+class ShardedSimulation:
+    """
+    One game stepped by several worker processes. The arena's regions are
+    split into shards of neighboring regions and each worker steps the life
+    forms and plants of one shard. Targets are only ever found in a life
+    form's own region, so shards only meet at the borders: life forms that
+    cross a gap are handed over at the end of the tick, and life forms near
+    a border are mirrored as ghosts, so reproduction and fights across a gap
+    still happen. What a shard does to a ghost reaches the ghost's own shard
+    a tick later. Plants spawn where this process draws them.
+
+    The same seed and shards replay the same game, but it is not the game
+    Simulation would play, as every shard has its own random stream and
+    every type's cap is checked against the population at the start of the
+    tick plus the shard's own births.
+    """
+
+    def __init__(self, sim, shards=None, seed=None):
+        arena = sim.arena
+        self.arena = arena
+        self.shards = min(shards or os.cpu_count() or 1, arena.regions, MAX_SHARDS)
+        # Blocks of neighboring regions in reading order
+        self.region_shards = [region * self.shards // arena.regions for region in range(arena.regions)]
+        self.seed = seed if seed is not None else random.randrange(1 << 63)
+        # Plant spawns are drawn here, for the whole arena
+        self.rng = random.Random(self.seed)
+
+        self.life_types = sim.life_types
+        self.life_type_parameters = sim.life_type_parameters
+        self.max_plants = sim.max_plants
+        self.tick = sim.tick
+        self.population = dict(sim.population)
+        self.plant_count = len(sim.plants)
+        self.winner_type = None
+        self.winning_parameters = None
+
+        # Every worker builds its shard from the same snapshot of the world
+        data = snapshot_bytes(sim)
+        snapshot = SharedMemory(create=True, size=len(data))
+        snapshot.buf[:len(data)] = data
+        self.connections = []
+        self.processes = []
+        try:
+            for shard in range(self.shards):
+                connection, worker_connection = Pipe()
+                process = Process(
+                    target=run_shard,
+                    args=(worker_connection, shard, self.region_shards, snapshot.name, len(data),
+                          shard_seed(self.seed, shard)),
+                    daemon=True,
+                )
+                process.start()
+                worker_connection.close()
+                self.connections.append(connection)
+                self.processes.append(process)
+            # Outbox names of every shard, for both tick parities
+            self.outboxes = [connection.recv() for connection in self.connections]
+        finally:
+            snapshot.close()
+            snapshot.unlink()
+        self.check_winner()
+
+    def __len__(self):
+        return sum(self.population.values())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def finished(self):
+        return self.winner_type is not None or not any(self.population.values())
+
+    def step(self, n=1):
+        """
+        Advance the world by n ticks, stopping early once a winner is found.
+        """
+        for _ in range(n):
+            if self.finished:
+                break
+            self.advance()
+
+    def advance(self):
+        arena = self.arena
+        self.tick += 1
+        spawns = [[] for _ in range(self.shards)]
+        if self.tick % PLANT_RESPAWN_TICKS == 0 and self.plant_count < self.max_plants:
+            position = (self.rng.randint(arena.left, arena.right), self.rng.randint(arena.top, arena.bottom))
+            spawns[self.region_shards[arena.region_of(position)]].append(position)
+
+        # Every shard reads the outboxes written in the last tick
+        peers = [names[(self.tick - 1) % 2] for names in self.outboxes]
+        for connection, shard_spawns in zip(self.connections, spawns):
+            connection.send(('tick', shard_spawns, self.population, peers))
+        plant_count = 0
+        for shard, connection in enumerate(self.connections):
+            changes, plants, names = connection.recv()
+            for life_type, change in zip(self.life_types, changes):
+                self.population[life_type] += change
+            plant_count += plants
+            self.outboxes[shard] = names
+        self.plant_count = plant_count
+        self.check_winner()
+
+    def check_winner(self):
+        surviving = [life_type for life_type, count in self.population.items() if count > 0]
+        if len(surviving) == 1:
+            self.winner_type = surviving[0]
+            for connection in self.connections:
+                connection.send(('winner', self.winner_type))
+                parameters = connection.recv()
+                if parameters is not None:
+                    self.winning_parameters = parameters
+                    break
+
+    def run_until_winner(self, max_ticks=None):
+        """
+        Step until only one life type remains (or max_ticks have passed) and
+        return the winning type, or None if there is none.
+        """
+        while not self.finished:
+            if max_ticks is not None and self.tick >= max_ticks:
+                break
+            self.advance()
+        return self.winner_type
+
+    def life_form_records(self):
+        """
+        Return (id, life type, x, y, energy) of every life form, shard by
+        shard.
+        """
+        records = []
+        for connection in self.connections:
+            connection.send(('life_forms',))
+            records.extend(connection.recv())
+        return records
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(('close',))
+        for process in self.processes:
+            process.join()
+        for connection in self.connections:
+            connection.close()
+        self.connections = []
+        self.processes = []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run one large headless SynthLife game on several processes.")
+    parser.add_argument('--shards', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--seed', type=int, default=None, help="game seed, reproduces the game with the same shards")
+    parser.add_argument('--max-ticks', type=int, default=None, help="ticks after which the game ends without a winner")
+    parser.add_argument('--width', type=int, default=WIDTH, help="arena width in pixels")
+    parser.add_argument('--height', type=int, default=HEIGHT, help="arena height in pixels, header included")
+    parser.add_argument('--columns', type=int, default=REGION_COLUMNS, help="columns of regions, one life type each")
+    parser.add_argument('--rows', type=int, default=REGION_ROWS, help="rows of regions")
+    parser.add_argument('--life-forms', type=int, default=NUM_EACH_LIFE_FORM,
+                        help="life forms each type starts with")
+    parser.add_argument('--max-per-type', type=int, default=MAX_LIFEFORMS_PER_TYPE,
+                        help="most life forms of one type alive at once")
+    args = parser.parse_args(argv)
+
+    seed = args.seed if args.seed is not None else random.randrange(1 << 63)
+    sim = Simulation(
+        seed=seed,
+        width=args.width,
+        height=args.height,
+        columns=args.columns,
+        rows=args.rows,
+        num_each_life_form=args.life_forms,
+        max_per_type=args.max_per_type,
+    )
+    with ShardedSimulation(sim, shards=args.shards, seed=seed) as game:
+        print(f"Game seed {seed}, {len(game.life_types)} types in {game.shards} shards")
+        start = last_report = time.perf_counter()
+        while not game.finished and (args.max_ticks is None or game.tick < args.max_ticks):
+            game.advance()
+            now = time.perf_counter()
+            if now - last_report >= REPORT_INTERVAL:
+                print(f"tick {game.tick}, {game.tick / (now - start):.0f} ticks/s, {len(game)} life forms")
+                last_report = now
+        print(f"Winner {game.winner_type} after {game.tick} ticks" if game.winner_type else f"No winner after {game.tick} ticks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1202 @@
+import random
+import math
+from collections import Counter, OrderedDict
+
+from arena import build_arena
+from plants import PlantField, pick_from_groups
+from spatial import SpatialHash
+
+# Arena dimensions
+WIDTH, HEIGHT = 1800, 960
+HEADER_HEIGHT = 100  # Height reserved for header at the top
+
+# Colors and their corresponding attributes
+ATTRIBUTE_COLORS = {
+    'attack_power': (255, 0, 0),         # Red
+    'defense': (0, 0, 255),              # Blue
+    'speed': (0, 255, 0),                # Green
+    'energy_storage': (255, 255, 0),     # Yellow
+    'vision_range': (128, 0, 128),       # Purple
+    'reproduction_rate': (0, 255, 255),  # Cyan
+    'metabolism_rate': (255, 165, 0),    # Orange
+    'stealth': (128, 128, 128),          # Gray
+    'intelligence': (255, 255, 255)      # White
+}
+
+# Reverse mapping for quick color to attribute conversion
+COLOR_TO_ATTRIBUTE = {v: k for k, v in ATTRIBUTE_COLORS.items()}
+
+# Simulation parameters
+NUM_PLANTS = 200
+MAX_PLANTS = 200
+NUM_EACH_LIFE_FORM = 10
+PLANT_RESPAWN_TIME = 250
+
+# Simulation ticks per second of game time
+TICKS_PER_SECOND = 60
+
+# Plant respawn interval in simulation ticks
+PLANT_RESPAWN_TICKS = PLANT_RESPAWN_TIME * TICKS_PER_SECOND // 1000
+
+# Average number of plants per plant grid cell when the field is full
+PLANTS_PER_CELL = 16
+
+# Pixels in a random genome, and the most pixels of any one attribute
+GENOME_PIXELS = 16
+MAX_PIXELS_PER_ATTRIBUTE = 5
+
+# Size in screen pixels of one genome pixel, and of a plant
+PIXEL_SIZE = 5
+PLANT_SIZE = 5
+
+# Largest life form image side (genomes live on a 5x5 grid)
+MAX_LIFE_FORM_SIZE = 5 * PIXEL_SIZE
+
+# Pixels a rect center can trail its life form's position by, with room to spare
+RECT_ROUNDING_MARGIN = 2
+
+# Pixels beyond its vision range a life form looks at after a fruitless search, to tell how
+# long nothing can come into range
+SEARCH_CLEARANCE = 100
+
+# Grouping Behavior Parameters
+GROUPING_RADIUS = 100
+COHESION_WEIGHT = 0.05
+
+# Fraction of each wall between two neighboring regions left open for crossing
+GAP_RATIO = 0.4
+
+# Columns and rows of regions the arena is divided into by default: four quarters
+REGION_COLUMNS = 2
+REGION_ROWS = 2
+
+# Define life_types globally; the default arena has one type per quarter
+life_types = ['A', 'B', 'C', 'D']
+
+# Define maximum number of lifeforms per type
+MAX_LIFEFORMS_PER_TYPE = 50
+
+# Mutation rate for offspring
+#MUTATION_RATE = 0.1
+
+# Define maximum energy for LifeForms
+MAX_ENERGY = 500  # *** Added: Maximum energy cap ***
+
+# Number of distinct genomes kept interned; the least recently used are dropped first
+GENOME_CACHE_SIZE = 1024
+
+
+# Axis-aligned rectangle with the same integer semantics as pygame.Rect,
+# so the simulation does not need pygame to detect contacts
+class Rect:
+    __slots__ = ('x', 'y', 'width', 'height')
+
+    def __init__(self, width, height, center=(0, 0)):
+        self.width = width
+        self.height = height
+        self.x = center[0] - width // 2
+        self.y = center[1] - height // 2
+
+    @property
+    def center(self):
+        return (self.x + self.width // 2, self.y + self.height // 2)
+
+    @center.setter
+    def center(self, value):
+        self.x = value[0] - self.width // 2
+        self.y = value[1] - self.height // 2
+
+    @property
+    def centerx(self):
+        return self.x + self.width // 2
+
+    @property
+    def centery(self):
+        return self.y + self.height // 2
+
+    @property
+    def topleft(self):
+        return (self.x, self.y)
+
+    @property
+    def size(self):
+        return (self.width, self.height)
+
+    def colliderect(self, other):
+        return (
+            self.x < other.x + other.width
+            and other.x < self.x + self.width
+            and self.y < other.y + other.height
+            and other.y < self.y + self.height
+        )
+
+
+# Define Plant class
+class Plant:
+    __slots__ = ('rect', 'position', 'energy', 'alive', 'slot')
+
+    def __init__(self, position=None, rng=random):
+        self.rect = Rect(PLANT_SIZE, PLANT_SIZE)
+        if position:
+            self.rect.center = position
+        else:
+            self.rect.center = (rng.randint(0, WIDTH), rng.randint(HEADER_HEIGHT, HEIGHT))
+        # Plants never move, so the center is kept as a plain tuple
+        self.position = self.rect.center
+        self.energy = 25  # Energy provided when consumed
+        self.alive = True
+        # Index in the plant field, None once eaten
+        self.slot = None
+
+
+# Function to name the life types of an arena with the given number of regions: A to Z, then AA, AB and so on
+def region_life_types(count):
+    names = []
+    for index in range(count):
+        name = ''
+        index += 1
+        while index:
+            index, letter = divmod(index - 1, 26)
+            name = chr(ord('A') + letter) + name
+        names.append(name)
+    return names
+
+
+def get_initial_pixels(life_type, rng=random):
+    # Define symmetrical patterns for each life type
+    if life_type == 'A':
+        pixels = [
+            (0, -1, ATTRIBUTE_COLORS['speed']),
+            (-1, 0, ATTRIBUTE_COLORS['vision_range']),
+            (0, 0, ATTRIBUTE_COLORS['speed']),
+            (1, 0, ATTRIBUTE_COLORS['vision_range']),
+            (0, 1, ATTRIBUTE_COLORS['speed']),
+            (-1, -1, ATTRIBUTE_COLORS['speed']),
+            (1, -1, ATTRIBUTE_COLORS['speed']),
+            (-1, 1, ATTRIBUTE_COLORS['speed']),
+            (1, 1, ATTRIBUTE_COLORS['speed']),
+            (0, -2, ATTRIBUTE_COLORS['intelligence']),
+        ]
+    elif life_type == 'B':
+        pixels = [
+            (0, -1, ATTRIBUTE_COLORS['attack_power']),
+            (-1, 0, ATTRIBUTE_COLORS['defense']),
+            (0, 0, ATTRIBUTE_COLORS['attack_power']),
+            (1, 0, ATTRIBUTE_COLORS['defense']),
+            (0, 1, ATTRIBUTE_COLORS['attack_power']),
+            (-1, -1, ATTRIBUTE_COLORS['defense']),
+            (1, -1, ATTRIBUTE_COLORS['defense']),
+            (-1, 1, ATTRIBUTE_COLORS['defense']),
+            (1, 1, ATTRIBUTE_COLORS['defense']),
+            (0, -2, ATTRIBUTE_COLORS['intelligence']),
+        ]
+    elif life_type == 'C':
+        pixels = [
+            (0, -1, ATTRIBUTE_COLORS['speed']),
+            (-1, 0, ATTRIBUTE_COLORS['attack_power']),
+            (0, 0, ATTRIBUTE_COLORS['defense']),
+            (1, 0, ATTRIBUTE_COLORS['vision_range']),
+            (0, 1, ATTRIBUTE_COLORS['energy_storage']),
+            (-1, -1, ATTRIBUTE_COLORS['metabolism_rate']),
+            (1, -1, ATTRIBUTE_COLORS['reproduction_rate']),
+            (-1, 1, ATTRIBUTE_COLORS['stealth']),
+            (1, 1, ATTRIBUTE_COLORS['intelligence']),
+            (0, -2, ATTRIBUTE_COLORS['intelligence']),
+        ]
+    elif life_type == 'D':
+        pixels = [
+            (0, -1, ATTRIBUTE_COLORS['energy_storage']),
+            (-1, 0, ATTRIBUTE_COLORS['reproduction_rate']),
+            (0, 0, ATTRIBUTE_COLORS['energy_storage']),
+            (1, 0, ATTRIBUTE_COLORS['reproduction_rate']),
+            (0, 1, ATTRIBUTE_COLORS['energy_storage']),
+            (-1, -1, ATTRIBUTE_COLORS['energy_storage']),
+            (1, -1, ATTRIBUTE_COLORS['energy_storage']),
+            (-1, 1, ATTRIBUTE_COLORS['energy_storage']),
+            (1, 1, ATTRIBUTE_COLORS['energy_storage']),
+            (0, -2, ATTRIBUTE_COLORS['intelligence']),
+        ]
+    else:
+        pixels = generate_random_pixels(rng)
+    return pixels
+
+
+def generate_random_pixels(rng=random):
+    # Generate random symmetrical pixels
+    return complete_pixels([], rng)
+
+
+def complete_pixels(pixels, rng=random):
+    """
+    Add random symmetrical pixels to a partial genome until it has
+    GENOME_PIXELS pixels, keeping at most MAX_PIXELS_PER_ATTRIBUTE pixels of
+    each attribute. Returns a new list.
+    """
+    pixels = list(pixels)
+    positions = {(x, y) for x, y, _ in pixels}
+    num_pixels = GENOME_PIXELS  # Total number of pixels in the life form
+
+    # Attribute pixel counters to enforce the maximum of 5 pixels per attribute
+    attribute_pixel_counts = {attr: 0 for attr in ATTRIBUTE_COLORS.keys()}
+    for _, _, color in pixels:
+        attribute_pixel_counts[COLOR_TO_ATTRIBUTE[color]] += 1
+    max_pixels_per_attribute = MAX_PIXELS_PER_ATTRIBUTE
+
+    while len(pixels) < num_pixels:
+        x = rng.randint(-2, 2)
+        y = rng.randint(-2, 2)
+
+        if (x, y) not in positions:
+            # Select a random attribute color with the constraint of max 5 pixels per attribute
+            available_colors = [
+                color for attr, color in ATTRIBUTE_COLORS.items()
+                if attribute_pixel_counts[attr] < max_pixels_per_attribute
+            ]
+            if not available_colors:
+                break  # This should never happen but ensures safety
+
+            color = rng.choice(available_colors)
+            attribute = COLOR_TO_ATTRIBUTE[color]
+            pixels.append((x, y, color))
+            positions.add((x, y))
+            attribute_pixel_counts[attribute] += 1
+
+            # Add symmetrical counterpart if within bounds and within the 5x5 grid
+            if x != 0 or y != 0:
+                sym_x, sym_y = -x, y
+                if (
+                    (sym_x, sym_y) not in positions
+                    and len(pixels) < num_pixels
+                    and -2 <= sym_x <= 2
+                    and -2 <= sym_y <= 2
+                ):
+                    pixels.append((sym_x, sym_y, color))
+                    positions.add((sym_x, sym_y))
+                    attribute_pixel_counts[attribute] += 1
+
+    # Ensure we have exactly num_pixels pixels
+    if len(pixels) > num_pixels:
+        pixels = pixels[:num_pixels]
+
+    return pixels
+
+
+def pixel_units(pixels):
+    """
+    Split pixels into the units the symmetry rule creates: a pixel together
+    with its mirror image of the same color, or a pixel on its own.
+    """
+    colors = {(x, y): color for x, y, color in pixels}
+    seen = set()
+    units = []
+    for x, y, color in pixels:
+        if (x, y) in seen:
+            continue
+        seen.add((x, y))
+        unit = [(x, y, color)]
+        if x != 0 and (-x, y) not in seen and colors.get((-x, y)) == color:
+            seen.add((-x, y))
+            unit.append((-x, y, color))
+        units.append(unit)
+    return units
+
+
+# Function to mutate a genome, recoloring or regrowing one symmetrical unit at a time
+def mutate_pixels(pixels, rng=random, mutations=1):
+    pixels = list(pixels)
+    for _ in range(mutations):
+        unit = rng.choice(pixel_units(pixels))
+        rest = [pixel for pixel in pixels if pixel not in unit]
+        if rng.random() < 0.5:
+            # Recolor the unit within the limit of pixels per attribute
+            counts = calculate_attributes(rest)
+            colors = [
+                color for attr, color in ATTRIBUTE_COLORS.items()
+                if color != unit[0][2] and counts[attr] + len(unit) <= MAX_PIXELS_PER_ATTRIBUTE
+            ]
+            if colors:
+                color = rng.choice(colors)
+                pixels = rest + [(x, y, color) for x, y, _ in unit]
+        else:
+            # Drop the unit and grow new random pixels in its place
+            pixels = complete_pixels(rest, rng)
+    return sorted(pixels)
+
+
+# Function to cross two genomes over by mixing their symmetrical units
+def crossover_pixels(pixels_a, pixels_b, rng=random):
+    units = pixel_units(pixels_a) + pixel_units(pixels_b)
+    rng.shuffle(units)
+    # Place mirrored pairs before single pixels so the child stays symmetrical
+    units.sort(key=len, reverse=True)
+    child = []
+    positions = set()
+    counts = dict.fromkeys(ATTRIBUTE_COLORS.keys(), 0)
+    for unit in units:
+        attribute = COLOR_TO_ATTRIBUTE[unit[0][2]]
+        if (
+            len(child) + len(unit) > GENOME_PIXELS
+            or counts[attribute] + len(unit) > MAX_PIXELS_PER_ATTRIBUTE
+            or any((x, y) in positions for x, y, _ in unit)
+        ):
+            continue
+        child.extend(unit)
+        positions.update((x, y) for x, y, _ in unit)
+        counts[attribute] += len(unit)
+    # Fill whatever the parents' units could not
+    return sorted(complete_pixels(child, rng))
+
+
+def calculate_attributes(pixels):
+    # Count the number of pixels of each color
+    color_counts = Counter([tuple(color) for _, _, color in pixels])
+    # Initialize attributes
+    attributes = dict.fromkeys(ATTRIBUTE_COLORS.keys(), 0)
+    # Update attributes based on pixel counts
+    for color, count in color_counts.items():
+        attribute = COLOR_TO_ATTRIBUTE[color]
+        attributes[attribute] = count
+    return attributes
+
+
+def calculate_image_bounds(pixels):
+    """
+    Return the (width, height) of the image drawn from the pixels and the
+    offset of its top-left corner relative to the life form's center pixel.
+    """
+    min_x = min(x for x, _, _ in pixels)
+    max_x = max(x for x, _, _ in pixels)
+    min_y = min(y for _, y, _ in pixels)
+    max_y = max(y for _, y, _ in pixels)
+    width = (max_x - min_x + 1) * PIXEL_SIZE
+    height = (max_y - min_y + 1) * PIXEL_SIZE
+    return (width, height), [min_x * PIXEL_SIZE, min_y * PIXEL_SIZE]
+
+
+class Genome:
+    """
+    Immutable pixels of a life form together with the attributes and image
+    bounds derived from them. Life forms with the same pixels share one Genome,
+    so none of this is recomputed or copied per life form.
+    """
+    __slots__ = ('pixels', 'attributes', 'size', 'offset', 'half_size')
+
+    def __init__(self, pixels):
+        self.pixels = pixels
+        # Shared by every life form of this genome, treat as read-only
+        self.attributes = calculate_attributes(pixels)
+        self.size, offset = calculate_image_bounds(pixels)
+        self.offset = tuple(offset)
+        self.half_size = (self.size[0] / 2, self.size[1] / 2)
+
+
+# Interned genomes keyed by their pixel tuple, least recently used first
+genome_cache = OrderedDict()
+
+
+# Function to get the shared Genome for a list of pixels
+def intern_genome(pixels):
+    key = tuple((x, y, tuple(color)) for x, y, color in pixels)
+    genome = genome_cache.get(key)
+    if genome is None:
+        genome = Genome(key)
+        genome_cache[key] = genome
+        if len(genome_cache) > GENOME_CACHE_SIZE:
+            genome_cache.popitem(last=False)
+    else:
+        genome_cache.move_to_end(key)
+    return genome
+
+
+class LifeTypeStats:
+    """
+    Running totals over the alive life forms of one type: their number, their
+    energy and the sums of their attributes. The world updates them on every
+    birth, death and change of energy, so reading them costs the same
+    whatever the population.
+    """
+    __slots__ = ('count', 'energy', 'attribute_totals', 'genomes')
+
+    def __init__(self):
+        self.count = 0
+        self.energy = 0.0
+        self.attribute_totals = Counter()
+        # Alive life forms per genome; attribute ranges are taken over these
+        self.genomes = Counter()
+
+    def add(self, life_form):
+        self.count += 1
+        self.energy += life_form.energy
+        self.attribute_totals.update(life_form.attributes)
+        self.genomes[life_form.genome] += 1
+
+    def remove(self, life_form):
+        self.count -= 1
+        self.energy -= life_form.energy
+        self.attribute_totals.subtract(life_form.attributes)
+        genome = life_form.genome
+        self.genomes[genome] -= 1
+        if not self.genomes[genome]:
+            del self.genomes[genome]
+        if not self.count:
+            # Drop the rounding error the running sum has gathered
+            self.energy = 0.0
+
+    @property
+    def average_energy(self):
+        return self.energy / self.count if self.count else 0
+
+    def average_attributes(self):
+        if not self.count:
+            return {}
+        return {attr: total / self.count for attr, total in self.attribute_totals.items()}
+
+    def attribute_ranges(self):
+        # {attribute: (min, max)} over the alive life forms
+        ranges = {}
+        for genome in self.genomes:
+            for attr, value in genome.attributes.items():
+                low, high = ranges.get(attr, (value, value))
+                ranges[attr] = (min(low, value), max(high, value))
+        return ranges
+
+
+# Define LifeForm class
+class LifeForm:
+    def __init__(self, life_type, position=None, pixels=None, genome=None, rng=random):
+        self.life_type = life_type
+        self.energy = 200
+        self.alive = True
+        if position:
+            self.position = position
+        else:
+            self.position = [float(rng.randint(0, WIDTH)), float(rng.randint(HEADER_HEIGHT, HEIGHT))]
+        if genome is None:
+            genome = intern_genome(pixels if pixels else get_initial_pixels(life_type, rng))
+        self.genome = genome
+        self.pixels = genome.pixels
+        self.attributes = genome.attributes
+        self.size = genome.size
+        self.offset = genome.offset
+        self.half_size = genome.half_size
+        self.rect = Rect(*self.size)
+        self.rect.center = (int(self.position[0]), int(self.position[1]))
+        self.target = None
+        self.direction = rng.uniform(0, 2 * math.pi)
+        self.reproduction_cooldown = 0
+        # World travel below which nothing can have come into range since the last fruitless search
+        self.search_travel = 0.0
+        # Position at the start of the current tick
+        self.tick_start = tuple(self.position)
+
+    def update_attributes(self):
+        self.attributes = self.genome.attributes
+
+    def update(self, world):
+        """
+        Advance the life form by one tick: spend energy, find a target and
+        move. Contacts with plants and other life forms are left to the
+        world's contact stage, once everyone has moved.
+        """
+        if not self.alive:
+            return
+
+        # Energy depletion over time
+        metabolism = round((5 - self.attributes.get('metabolism_rate', 0)) / 2.5)
+        energy_used = 0.05 * metabolism
+        self.energy -= energy_used
+        world.stats[self.life_type].energy -= energy_used
+
+        # If energy runs out, die
+        if self.energy <= 0:
+            self.die(world)
+            return
+        self.tick_start = tuple(self.position)
+
+        # Reproduction cooldown logic
+        if self.reproduction_cooldown > 0:
+            self.reproduction_cooldown -= 1
+
+        # Find target if none, unless nothing can have come into range since the last search found nothing
+        if (not self.target or not self.target.alive) and world.travel >= self.search_travel:
+            self.find_target(world)
+
+        # Move towards target or wander, with grouping behavior
+        if self.target:
+            self.move_towards_target(world)
+        else:
+            self.wander(world.rng)
+
+        world.count_travel(self.settle(world))
+
+    def settle(self, world):
+        """
+        Keep the life form in its region after a move and bring its rect and
+        index entry up to date. Returns how far it is from where it started
+        the tick.
+        """
+        self.enforce_boundaries(world)
+        self.rect.center = (int(self.position[0]), int(self.position[1]))
+        world.life_form_index.move(self, self.rect.center)
+        start_x, start_y = self.tick_start
+        return math.hypot(self.position[0] - start_x, self.position[1] - start_y)
+
+    def ready_to_mate(self, world):
+        # Enough energy, off cooldown and room left in the world for its type
+        reproduction_threshold = 200 + (self.attributes['energy_storage'] * 10)
+        return (
+            self.energy >= reproduction_threshold
+            and self.reproduction_cooldown == 0
+            and world.population[self.life_type] < world.max_per_type
+        )
+
+    def mate(self, partner, world):
+        # Only called once ready_to_mate(), so there is room for at least one offspring
+        offspring_allowed = world.max_per_type - world.population[self.life_type]
+        if offspring_allowed >= 2:
+            # Each parent contributes energy for one offspring
+            energy_contribution = min(self.energy, partner.energy) / 3
+            self.energy -= energy_contribution
+            partner.energy -= energy_contribution
+            world.stats[self.life_type].energy -= 2 * energy_contribution
+
+            # Create two offspring
+            offspring1 = self.reproduce(energy_contribution, world.rng)
+            offspring2 = partner.reproduce(energy_contribution, world.rng)
+            world.add_life_form(offspring1)
+            world.add_life_form(offspring2)
+        else:
+            # Each parent contributes energy for one offspring
+            energy_contribution = min(self.energy, partner.energy) / 4
+            self.energy -= energy_contribution
+            partner.energy -= energy_contribution
+            world.stats[self.life_type].energy -= 2 * energy_contribution
+
+            # Create one offspring
+            offspring = self.reproduce(energy_contribution, world.rng)
+            world.add_life_form(offspring)
+
+        # Set cooldowns
+        self.reproduction_cooldown = 300
+        partner.reproduction_cooldown = 300
+
+    def enforce_boundaries(self, world):
+        """
+        Prevent the life form from moving outside its designated region.
+        Adjust the direction when hitting a boundary.
+        """
+        if world.arena.confine(self.position, *self.half_size):
+            self.direction = (self.direction + math.pi) % (2 * math.pi)
+
+    def find_target(self, world):
+        vision_range = 100 + (self.attributes['vision_range'] * 10)
+        # Potential life form targets within vision range
+        possible_targets = []
+        # Whether any life form was in range to be detected at all
+        candidates_seen = False
+        # Distance to the nearest life form of another type, in any region
+        nearest_other = math.inf
+
+        # Bounds of the own region; testing candidates against them is cheaper than looking up their regions
+        bounds = world.region_bounds[world.arena.region_of(self.position)]
+        min_x, min_y, max_x, max_y = bounds
+
+        # Detect other life forms within vision range and same region
+        for life_form in world.life_form_index.query(self.position, vision_range):
+            if life_form != self and life_form.alive:
+                if life_form.life_type == self.life_type:
+                    continue
+                distance = self.distance_to(life_form.rect.center)
+                if distance < nearest_other:
+                    nearest_other = distance
+                if distance <= vision_range:
+                    x, y = life_form.rect.center
+                    if min_x <= x < max_x and min_y <= y < max_y:
+                        candidates_seen = True
+                        # Stealth and intelligence affect detection
+                        detection_chance = 1 - (life_form.attributes['stealth'] * 0.05)
+                        detection_chance += self.attributes['intelligence'] * 0.05
+                        detection_chance = max(0, min(detection_chance, 1))
+                        if world.rng.random() < detection_chance:
+                            possible_targets.append(life_form)
+
+        # Prioritize based on intelligence, plants in the same region coming from the plant field
+        if self.attributes['intelligence'] > 0:
+            # Nearest target, plants first on ties
+            target = world.plants.nearest(self.position, vision_range, bounds)
+            if possible_targets:
+                life_form = min(possible_targets, key=lambda t: self.distance_to(t.rect.center))
+                if target is None or self.distance_to(life_form.rect.center) < self.distance_to(target.position):
+                    target = life_form
+            self.target = target
+        else:
+            # Random target, every plant and life form in sight equally likely
+            plant_groups = world.plants.within(self.position, vision_range, bounds)
+            num_plants = sum(len(group) for group in plant_groups)
+            total = num_plants + len(possible_targets)
+            if total:
+                index = world.rng.randrange(total)
+                if index < num_plants:
+                    self.target = pick_from_groups(plant_groups, index)
+                else:
+                    self.target = possible_targets[index - num_plants]
+            else:
+                self.target = None
+
+        # Nothing in range, and nothing just beyond it that rules out waiting
+        if self.target is None and not candidates_seen and nearest_other > vision_range + RECT_ROUNDING_MARGIN:
+            self.wait_for_candidates(world, vision_range)
+
+    def wait_for_candidates(self, world, vision_range):
+        """
+        After a search without a single candidate, skip searching until
+        something can have come into range. Such a search draws no random
+        numbers, so skipping it changes nothing. Life forms and plants close
+        in by at most twice the world's travel in the meantime: the furthest
+        any life form moved in each tick, summed. New plants wake the life
+        forms around them.
+        """
+        radius = vision_range + SEARCH_CLEARANCE
+        px, py = self.position
+        # Squared distance to the nearest life form of another type, in any region. Those the
+        # query leaves out are further than radius; positions are within a pixel of the rect
+        # centers the search goes by, which RECT_ROUNDING_MARGIN allows for
+        nearest = radius * radius
+        too_close = (vision_range + RECT_ROUNDING_MARGIN) ** 2
+        for life_form in world.life_form_index.query(self.position, radius):
+            if life_form.life_type != self.life_type and life_form.alive:
+                dx = life_form.position[0] - px
+                dy = life_form.position[1] - py
+                distance = dx * dx + dy * dy
+                if distance < nearest:
+                    if distance <= too_close:
+                        return
+                    nearest = distance
+        nearest = math.sqrt(nearest)
+        plant = world.plants.nearest(self.position, nearest)
+        if plant is not None:
+            nearest = self.distance_to(plant.position)
+        clearance = nearest - vision_range - RECT_ROUNDING_MARGIN
+        if clearance > 0:
+            # Counted from the start of the tick, as others may have moved already
+            self.search_travel = world.tick_start_travel + clearance / 2
+
+    def move_towards_target(self, world):
+        # Calculate movement towards the target
+        dx = self.target.rect.centerx - self.position[0]
+        dy = self.target.rect.centery - self.position[1]
+        dist = math.hypot(dx, dy)
+        if dist == 0:
+            dist = 1
+        dx, dy = dx / dist, dy / dist  # Normalize
+        speed = 1 + (self.attributes['speed'] * 0.5)
+        move_x = dx * speed
+        move_y = dy * speed
+
+        # Incorporate Grouping Behavior
+        group_centroid = self.find_group_centroid(world)
+        if group_centroid:
+            # Calculate direction towards group centroid
+            group_dx = group_centroid[0] - self.position[0]
+            group_dy = group_centroid[1] - self.position[1]
+            group_dist = math.hypot(group_dx, group_dy)
+            if group_dist > 0:
+                group_dx, group_dy = group_dx / group_dist, group_dy / group_dist
+                # Apply cohesion weight
+                move_x += group_dx * COHESION_WEIGHT
+                move_y += group_dy * COHESION_WEIGHT
+
+        # Update position
+        self.position[0] += move_x
+        self.position[1] += move_y
+
+    def find_group_centroid(self, world):
+        """
+        Calculate the centroid of nearby same-type LifeForms within GROUPING_RADIUS.
+        """
+        nearby = []
+        # The index holds rect centers, which trail positions by under a pixel
+        for lf in world.life_form_index.query(self.position, GROUPING_RADIUS + 1):
+            if lf != self and lf.life_type == self.life_type and lf.alive:
+                distance = self.distance_to(lf.position)
+                if distance <= GROUPING_RADIUS:
+                    nearby.append(lf.position)
+        if nearby:
+            avg_x = sum(pos[0] for pos in nearby) / len(nearby)
+            avg_y = sum(pos[1] for pos in nearby) / len(nearby)
+            return (avg_x, avg_y)
+        return None
+
+    def interact_with_target(self, world):
+        if isinstance(self.target, Plant):
+            # *** Enforce the maximum energy cap ***
+            energy = min(self.energy + self.target.energy, MAX_ENERGY)
+            world.stats[self.life_type].energy += energy - self.energy
+            self.energy = energy
+            world.remove_plant(self.target, eater=self)
+            self.target = None
+        elif isinstance(self.target, LifeForm):
+            if self.target.alive:
+                if self.target.life_type == self.life_type:
+                    self.target = None
+                    return
+                # Decide to fight or flee based on intelligence
+                if self.should_fight(self.target, world.rng):
+                    self.fight(self.target, world)
+                else:
+                    self.flee(self.target)
+                    world.count_travel(self.settle(world))
+            else:
+                self.target = None
+
+    def should_fight(self, other, rng=random):
+        # Decision based on attack and defense attributes
+        my_power = self.attributes['attack_power'] + self.attributes['defense']
+        other_power = other.attributes['attack_power'] + other.attributes['defense']
+        intelligence = self.attributes['intelligence']
+        if intelligence > 0:
+            return my_power >= other_power
+        else:
+            return rng.choice([True, False])
+
+    def fight(self, other, world):
+        # Combat resolution
+        my_attack = self.attributes['attack_power'] + world.rng.randint(0, 5)
+        other_attack = other.attributes['attack_power'] + world.rng.randint(0, 5)
+        my_defense = self.attributes['defense']
+        other_defense = other.attributes['defense']
+
+        damage_to_other = max(0, my_attack - other_defense)
+        damage_to_self = max(0, other_attack - my_defense)
+
+        self.energy -= damage_to_self
+        other.energy -= damage_to_other
+        world.stats[self.life_type].energy -= damage_to_self
+        world.stats[other.life_type].energy -= damage_to_other
+        world.record_event('fight', self, other)
+
+        if self.energy <= 0:
+            self.die(world)
+        if other.energy <= 0:
+            other.die(world)
+
+    def flee(self, threat):
+        # Move away from the threat
+        dx = self.position[0] - threat.position[0]
+        dy = self.position[1] - threat.position[1]
+        dist = math.hypot(dx, dy)
+        if dist == 0:
+            dist = 1
+        dx, dy = dx / dist, dy / dist  # Normalize
+        speed = 1 + (self.attributes['speed'] * 0.5)
+        self.position[0] += dx * speed
+        self.position[1] += dy * speed
+
+    def wander(self, rng=random):
+        # Random movement
+        if rng.random() < 0.1:
+            self.direction += rng.uniform(-0.5, 0.5)
+        speed = 1 + (self.attributes['speed'] * 0.5)
+        self.position[0] += math.cos(self.direction) * speed
+        self.position[1] += math.sin(self.direction) * speed
+
+    def distance_to(self, position):
+        dx = self.position[0] - position[0]
+        dy = self.position[1] - position[1]
+        return math.hypot(dx, dy)
+
+    def die(self, world):
+        # Dead life forms are dropped from the world at the end of the tick
+        if self.alive:
+            self.alive = False
+            world.count_death(self)
+
+    def reproduce(self, energy_contribution, rng=random):
+        # Offspring share the parent's genome with possible mutation
+        genome = self.genome
+        # Introduce mutation
+        #if rng.random() < MUTATION_RATE:
+        #    new_pixels = list(genome.pixels)
+        #    index = rng.randint(0, len(new_pixels) - 1)
+        #    new_color = rng.choice(list(ATTRIBUTE_COLORS.values()))
+        #    new_pixels[index] = (new_pixels[index][0], new_pixels[index][1], new_color)
+        #    genome = intern_genome(new_pixels)
+        offspring = LifeForm(
+            life_type=self.life_type,
+            position=self.position.copy(),
+            genome=genome,
+            rng=rng
+        )
+        # *** Ensure offspring's energy does not exceed MAX_ENERGY ***
+        offspring.energy = min(energy_contribution, MAX_ENERGY)
+        offspring.direction = rng.uniform(0, 2 * math.pi)
+        offspring.reproduction_cooldown = 0
+        return offspring
+
+
+# Function to choose the pixels and attributes of every life type for a new game
+def choose_life_type_parameters(winning_life_type=None, winning_parameters=None, rng=random, types=None):
+    life_type_parameters = {}
+    for life_type in types or life_types:
+        if life_type == winning_life_type and winning_parameters is not None:
+            # Use the winning parameters for the retained life type
+            pixels = winning_parameters['pixels']
+            attributes = dict(winning_parameters['attributes'])
+        else:
+            # Generate new random parameters for other life types
+            pixels = generate_random_pixels(rng)
+            attributes = calculate_attributes(pixels)
+
+        # Ensure colors are tuples
+        pixels = [(x, y, tuple(color)) for x, y, color in pixels]
+
+        life_type_parameters[life_type] = {'pixels': pixels, 'attributes': attributes}
+    return life_type_parameters
+
+
+class Simulation:
+    """
+    One game: plants, life forms and the arena geometry, advanced tick by tick
+    without any display.
+
+    The arena may be larger than the screen and divided into any grid of
+    columns x rows regions, each life type starting in its own region. By
+    default there is one type per region, named A, B, C and so on.
+    """
+
+    def __init__(
+        self,
+        life_type_parameters=None,
+        num_plants=NUM_PLANTS,
+        max_plants=MAX_PLANTS,
+        seed=None,
+        populate=True,
+        width=WIDTH,
+        height=HEIGHT,
+        columns=REGION_COLUMNS,
+        rows=REGION_ROWS,
+        num_each_life_form=NUM_EACH_LIFE_FORM,
+        max_per_type=MAX_LIFEFORMS_PER_TYPE,
+    ):
+        # Walls and gaps between the regions
+        self.arena = build_arena(width, height, HEADER_HEIGHT, GAP_RATIO, columns, rows)
+        self.region_bounds = [self.arena.region_bounds(region) for region in range(self.arena.regions)]
+
+        # All randomness of this world comes from its own stream, so a seed reproduces a game
+        self.rng = random.Random(seed)
+        if life_type_parameters is None:
+            life_type_parameters = choose_life_type_parameters(
+                rng=self.rng, types=region_life_types(self.arena.regions),
+            )
+        self.life_type_parameters = life_type_parameters
+        # Life types in the order of the regions they start in
+        self.life_types = list(life_type_parameters)
+        if len(self.life_types) > self.arena.regions:
+            raise ValueError(f"{len(self.life_types)} life types do not fit in {self.arena.regions} regions")
+        self.num_each_life_form = num_each_life_form
+        self.max_per_type = max_per_type
+
+        self.tick = 0
+        self.winner_type = None
+        self.winning_parameters = None
+
+        # Live number of alive life forms per type, and the types with any left
+        self.population = dict.fromkeys(self.life_types, 0)
+        self.surviving_types = set()
+        # Running energy and attribute totals per type, for the header and reports
+        self.stats = {life_type: LifeTypeStats() for life_type in self.life_types}
+
+        # One shared genome per life type
+        self.genomes = genomes = {
+            life_type: intern_genome(params['pixels'])
+            for life_type, params in life_type_parameters.items()
+        }
+
+        # Spatial indexes, sized so most queries touch only the 3x3 cells around a point
+        max_vision_range = max(
+            100 + genome.attributes['vision_range'] * 10
+            for genome in genomes.values()
+        )
+        cell_size = max(max_vision_range, GROUPING_RADIUS)
+        self.life_form_index = SpatialHash(cell_size)
+
+        # Plant grid cells hold about PLANTS_PER_CELL plants when the field is full
+        arena = self.arena
+        arena_area = (arena.right - arena.left) * (arena.bottom - arena.top)
+        plant_cell_size = math.sqrt(arena_area * PLANTS_PER_CELL / max(max_plants, 1))
+        plant_cell_size = min(max(plant_cell_size, PLANT_SIZE), max_vision_range)
+
+        self.max_plants = max_plants
+        self.plants = PlantField(plant_cell_size)
+
+        # Life forms in update order, and one example of each type kept for display
+        self.life_forms = []
+        self.life_form_examples = {}
+
+        # Life forms born during the current tick, None between ticks, and those that died since
+        # the last cleanup; both are applied to life_forms in one go at the end of the tick
+        self.births = None
+        self.deaths = []
+
+        # Events of the current tick, kept once a recorder is attached; it is called after every tick
+        self.events = None
+        self.recorder = None
+
+        # Sum of the furthest move any life form made in each tick, the current one so far,
+        # and the sum at the start of the current tick; see LifeForm.wait_for_candidates
+        self.travel = 0.0
+        self.tick_travel = 0.0
+        self.tick_start_travel = 0.0
+
+        # Phase timer of the ticks, e.g. a profiling.Profiler; None keeps ticks uninstrumented
+        self.profiler = None
+
+        # Time series of the per-type totals, e.g. a history.PopulationHistory; called after every tick
+        self.history = None
+
+        # An empty world is left to be filled in, e.g. from a snapshot
+        if populate:
+            self.populate(num_plants)
+
+    def populate(self, num_plants):
+        # Spawn initial plants
+        for _ in range(num_plants):
+            self.add_plant(self.new_plant())
+
+        # Spawn initial life forms, each type in its own region
+        for region, life_type in enumerate(self.life_types):
+            genome = self.genomes[life_type]
+            region_start, region_end = self.arena.region_area(region)
+            for _ in range(self.num_each_life_form):
+                x = self.rng.randint(region_start[0], region_end[0] - 1)
+                y = self.rng.randint(region_start[1], region_end[1] - 1)
+                position = [float(x), float(y)]
+                life_form = LifeForm(life_type=life_type, genome=genome, position=position, rng=self.rng)
+                self.add_life_form(life_form)
+                if not self.life_form_examples.get(life_type):
+                    self.life_form_examples[life_type] = life_form
+
+    def add_life_form(self, life_form):
+        # Offspring join the update order at the end of the tick; they are seen by the others at once
+        if self.births is None:
+            self.life_forms.append(life_form)
+        else:
+            self.births.append(life_form)
+        self.life_form_index.insert(life_form, life_form.rect.center)
+        self.population[life_form.life_type] = self.population.get(life_form.life_type, 0) + 1
+        self.surviving_types.add(life_form.life_type)
+        self.stats[life_form.life_type].add(life_form)
+        self.record_event('birth', life_form)
+
+    def count_death(self, life_form):
+        life_type = life_form.life_type
+        self.population[life_type] -= 1
+        if self.population[life_type] == 0:
+            self.surviving_types.discard(life_type)
+        self.stats[life_type].remove(life_form)
+        self.deaths.append(life_form)
+        self.record_event('death', life_form)
+
+    def record_event(self, *event):
+        # Events are only kept while someone is listening, e.g. a replay recorder
+        if self.events is not None:
+            self.events.append(event)
+
+    def new_plant(self):
+        # A plant at a random spot of the arena
+        arena = self.arena
+        return Plant((self.rng.randint(arena.left, arena.right), self.rng.randint(arena.top, arena.bottom)))
+
+    def add_plant(self, plant):
+        self.plants.add(plant)
+        # Life forms waiting for something to come into range look again. A cell is at least a
+        # vision range, and a waiting life form moves under SEARCH_CLEARANCE / 2 in the meantime
+        wake_radius = self.life_form_index.cell_size + SEARCH_CLEARANCE / 2 + RECT_ROUNDING_MARGIN
+        for life_form in self.life_form_index.query(plant.position, wake_radius):
+            life_form.search_travel = 0.0
+        self.record_event('plant', plant)
+
+    def spawn_plant(self):
+        if len(self.plants) < self.max_plants:
+            self.add_plant(self.new_plant())
+
+    def remove_plant(self, plant, eater=None):
+        plant.alive = False
+        self.plants.remove(plant)
+        self.record_event('eat', plant, eater)
+
+    def count_travel(self, moved):
+        # The furthest move of the tick bounds how much closer anything came to a waiting life form
+        if moved > self.tick_travel:
+            self.travel += moved - self.tick_travel
+            self.tick_travel = moved
+
+    def find_contacts(self):
+        """
+        Broad phase of the contact stage. Only life forms that can act are
+        looked at: one touching the plant or life form it is after, and one
+        ready to mate, whose partners are looked up around it in the life
+        form index. Returns (life_form, plant) and (life_form, target) pairs
+        and (life_form, partners) for every life form ready to mate, all in
+        update order; partners are the touching life forms of its type off
+        cooldown, also in update order. Life forms this world does not
+        update, like a shard's ghosts, never act and come last as partners.
+        """
+        max_per_type = self.max_per_type
+        open_types = {life_type for life_type, count in self.population.items() if count < max_per_type}
+        plant_contacts = []
+        fights = []
+        ready = []
+        # Update order of the possible partners; only types with room left mate, so there are few
+        ranks = {}
+        for rank, life_form in enumerate(self.life_forms):
+            if not life_form.alive:
+                continue
+            target = life_form.target
+            if target is not None and target.alive and life_form.rect.colliderect(target.rect):
+                if isinstance(target, Plant):
+                    plant_contacts.append((life_form, target))
+                else:
+                    fights.append((life_form, target))
+            if not life_form.reproduction_cooldown and life_form.life_type in open_types:
+                ranks[life_form] = rank
+                if life_form.ready_to_mate(self):
+                    ready.append(life_form)
+
+        matings = []
+        last = len(self.life_forms)
+        for life_form in ready:
+            rect = life_form.rect
+            life_type = life_form.life_type
+            partners = [
+                other for other in self.life_form_index.query(rect.center, MAX_LIFE_FORM_SIZE)
+                if other.life_type == life_type and other is not life_form and other.alive
+                and not other.reproduction_cooldown and rect.colliderect(other.rect)
+            ]
+            if partners:
+                partners.sort(key=lambda other: ranks.get(other, last))
+                matings.append((life_form, partners))
+        return plant_contacts, fights, matings
+
+    def resolve_contacts(self):
+        """
+        Contact stage of a tick, once every life form has moved. The
+        contacts find_contacts() lists at its start are settled in a fixed
+        order: first every life form eats the plant it was after, then
+        fights are fought or fled from, then the life forms ready to mate
+        mate with their first partner still off cooldown. Each kind goes
+        in update order.
+        """
+        plant_contacts, fights, matings = self.find_contacts()
+        for life_form, plant in plant_contacts:
+            # Another life form may have eaten it first
+            if plant.alive:
+                life_form.interact_with_target(self)
+
+        for life_form, target in fights:
+            if life_form.alive and target.alive and life_form.target is target:
+                life_form.interact_with_target(self)
+
+        for life_form, partners in matings:
+            # Meals, fights and earlier matings change energies, cooldowns and populations
+            if not (life_form.alive and life_form.ready_to_mate(self)):
+                continue
+            for partner in partners:
+                if partner.alive and not partner.reproduction_cooldown:
+                    life_form.mate(partner, self)
+                    break
+
+    def step(self, n=1):
+        """
+        Advance the world by n ticks, stopping early once a winner is found.
+        """
+        for _ in range(n):
+            if self.finished:
+                break
+            if self.profiler is None:
+                self.advance()
+            else:
+                with self.profiler.tick(self):
+                    self.advance()
+
+    def advance(self):
+        # One tick; the profiler, if any, is told where each phase ends
+        profiler = self.profiler
+        self.tick += 1
+        self.tick_start_travel = self.travel
+        self.tick_travel = 0.0
+
+        # Respawn plants at a fixed rate
+        if self.tick % PLANT_RESPAWN_TICKS == 0:
+            self.spawn_plant()
+        if profiler is not None:
+            profiler.lap('plants')
+
+        # Move life forms, then settle their contacts; the list is left alone until the births and deaths are applied
+        self.births = []
+        for life_form in self.life_forms:
+            life_form.update(self)
+        if profiler is not None:
+            profiler.lap('life_forms')
+        self.resolve_contacts()
+        if profiler is not None:
+            profiler.lap('contact_stage')
+        births = self.births
+        self.births = None
+        if births:
+            self.life_forms.extend(births)
+        if self.deaths:
+            for life_form in self.deaths:
+                self.life_form_index.remove(life_form)
+            self.deaths = []
+            self.life_forms = [lf for lf in self.life_forms if lf.alive]
+        if profiler is not None:
+            profiler.lap('cleanup')
+
+        self.check_winner()
+        if profiler is not None:
+            profiler.lap('winner')
+
+        if self.history is not None:
+            self.history.capture(self)
+
+        if self.recorder is not None:
+            self.recorder.capture(self)
+            if profiler is not None:
+                profiler.lap('recorder')
+
+    def run_until_winner(self, max_ticks=None):
+        """
+        Step until only one life type remains (or max_ticks have passed) and
+        return the winning type, or None if there is none.
+        """
+        while not self.finished:
+            if max_ticks is not None and self.tick >= max_ticks:
+                break
+            self.step()
+        return self.winner_type
+
+    @property
+    def finished(self):
+        return self.winner_type is not None or not self.surviving_types
+
+    def check_winner(self):
+        # Check if only one type of life form remains
+        if len(self.surviving_types) == 1:
+            self.winner_type = next(iter(self.surviving_types))
+            # Capture the winning life form's parameters
+            winning_life_form = next(lf for lf in self.life_forms if lf.life_type == self.winner_type)
+            self.winning_parameters = {
+                'pixels': list(winning_life_form.pixels),
+                'attributes': winning_life_form.attributes
+            }
+
+    def average_attributes(self, life_type):
+        # Average attributes of the given type's alive life forms, from the running totals
+        return self.stats[life_type].average_attributes()
+
+    def calculate_energy_metrics(self):
+        return {
+            life_type: {'total': stats.energy, 'average': stats.average_energy}
+            for life_type, stats in self.stats.items()
+        }
@@ -0,0 +1,257 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from simulation import (
+    WIDTH,
+    HEIGHT,
+    REGION_COLUMNS,
+    REGION_ROWS,
+    NUM_EACH_LIFE_FORM,
+    MAX_LIFEFORMS_PER_TYPE,
+    LifeForm,
+    Plant,
+    Simulation,
+    intern_genome,
+)
+
+# First bytes of every snapshot file
+MAGIC = b'SYNTHSNP'
+
+# Layout version, bumped whenever the layout changes
+VERSION = 1
+
+# Version and length of the JSON metadata, right after the magic
+HEADER = struct.Struct('<II')
+
+# Array sections start on multiples of this many bytes
+ALIGNMENT = 8
+
+# What a saved target index refers to
+NO_TARGET = 0
+PLANT_TARGET = 1
+LIFE_FORM_TARGET = 2
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+# Function to turn JSON pixel lists back into (x, y, color) tuples
+def _pixels_from_json(pixels):
+    return [(x, y, tuple(color)) for x, y, color in pixels]
+
+
+def snapshot_bytes(sim):
+    """
+    Serialize a Simulation between ticks. Per-object state goes into typed
+    arrays, everything else into a small JSON header. Plants and the life
+    form index are stored in grid bucket order, so a restored world makes the
+    same choices as the original.
+    """
+    plants = [plant for bucket in sim.plants.cells.values() for plant in bucket]
+    plant_slots = {plant: slot for slot, plant in enumerate(plants)}
+    life_forms = sim.life_forms
+    life_form_slots = {life_form: slot for slot, life_form in enumerate(life_forms)}
+
+    # Distinct genomes, referenced by index
+    genome_slots = {}
+    for life_form in life_forms + list(sim.life_form_examples.values()):
+        genome_slots.setdefault(life_form.genome, len(genome_slots))
+
+    target_kinds = array('b')
+    targets = array('i')
+    for life_form in life_forms:
+        target = life_form.target
+        # Eaten plants and dead life forms are as good as no target
+        if isinstance(target, Plant) and target in plant_slots:
+            target_kinds.append(PLANT_TARGET)
+            targets.append(plant_slots[target])
+        elif isinstance(target, LifeForm) and target in life_form_slots:
+            target_kinds.append(LIFE_FORM_TARGET)
+            targets.append(life_form_slots[target])
+        else:
+            target_kinds.append(NO_TARGET)
+            targets.append(-1)
+
+    type_ids = {life_type: type_id for type_id, life_type in enumerate(sim.life_types)}
+    rng_version, rng_state, gauss_next = sim.rng.getstate()
+    sections = {
+        'plant_x': array('i', (plant.position[0] for plant in plants)),
+        'plant_y': array('i', (plant.position[1] for plant in plants)),
+        'plant_energy': array('d', (plant.energy for plant in plants)),
+        'x': array('d', (life_form.position[0] for life_form in life_forms)),
+        'y': array('d', (life_form.position[1] for life_form in life_forms)),
+        'direction': array('d', (life_form.direction for life_form in life_forms)),
+        'energy': array('d', (life_form.energy for life_form in life_forms)),
+        'cooldown': array('i', (life_form.reproduction_cooldown for life_form in life_forms)),
+        'type': array('H', (type_ids[life_form.life_type] for life_form in life_forms)),
+        'genome': array('i', (genome_slots[life_form.genome] for life_form in life_forms)),
+        'target_kind': target_kinds,
+        'target': targets,
+        'index_order': array('i', (
+            life_form_slots[life_form] for bucket in sim.life_form_index.cells.values() for life_form in bucket
+        )),
+        'rng_state': array('I', rng_state),
+    }
+
+    layout = []
+    offset = 0
+    for name, values in sections.items():
+        layout.append([name, values.typecode, offset, len(values)])
+        offset = _align(offset + len(values) * values.itemsize)
+
+    meta = {
+        'tick': sim.tick,
+        'winner_type': sim.winner_type,
+        'winning_parameters': sim.winning_parameters,
+        'life_type_parameters': sim.life_type_parameters,
+        'max_plants': sim.max_plants,
+        'arena': [sim.arena.right, sim.arena.bottom, sim.arena.columns, sim.arena.rows],
+        'num_each_life_form': sim.num_each_life_form,
+        'max_per_type': sim.max_per_type,
+        'genomes': [list(genome.pixels) for genome in genome_slots],
+        'examples': {
+            life_type: [life_form_slots.get(life_form, -1), genome_slots[life_form.genome]]
+            for life_type, life_form in sim.life_form_examples.items()
+        },
+        'rng': [rng_version, gauss_next],
+        'byteorder': sys.byteorder,
+        'sections': layout,
+    }
+    meta_bytes = json.dumps(meta).encode()
+
+    start = _align(len(MAGIC) + HEADER.size + len(meta_bytes))
+    data = bytearray(start + offset)
+    data[:len(MAGIC)] = MAGIC
+    HEADER.pack_into(data, len(MAGIC), VERSION, len(meta_bytes))
+    data[len(MAGIC) + HEADER.size:len(MAGIC) + HEADER.size + len(meta_bytes)] = meta_bytes
+    for (_, _, section_offset, _), values in zip(layout, sections.values()):
+        raw = values.tobytes()
+        data[start + section_offset:start + section_offset + len(raw)] = raw
+    return bytes(data)
+
+
+def restore_snapshot(buffer, seed=None, world_class=Simulation):
+    """
+    Rebuild a Simulation from snapshot_bytes() output or any buffer holding
+    it, such as a memory-mapped file. With a seed the world's random stream is
+    reseeded after restoring, which forks a new run from the saved state.
+    world_class may be a Simulation subclass taking the same arguments.
+    """
+    with memoryview(buffer) as view:
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError("not a SynthLife snapshot")
+        version, meta_length = HEADER.unpack_from(view, len(MAGIC))
+        if version != VERSION:
+            raise ValueError(f"unsupported snapshot version {version}")
+        meta_start = len(MAGIC) + HEADER.size
+        meta = json.loads(bytes(view[meta_start:meta_start + meta_length]))
+        start = _align(meta_start + meta_length)
+
+        swap = meta['byteorder'] != sys.byteorder
+        values = {}
+        for name, typecode, offset, count in meta['sections']:
+            size = array(typecode).itemsize * count
+            raw = view[start + offset:start + offset + size]
+            if swap:
+                section = array(typecode, bytes(raw))
+                section.byteswap()
+                values[name] = section.tolist()
+            else:
+                with raw.cast(typecode) as section:
+                    values[name] = section.tolist()
+            raw.release()
+
+    life_type_parameters = {
+        life_type: {'pixels': _pixels_from_json(params['pixels']), 'attributes': params['attributes']}
+        for life_type, params in meta['life_type_parameters'].items()
+    }
+    # Snapshots from before arenas could be resized hold the default one
+    width, height, columns, rows = meta.get('arena', (WIDTH, HEIGHT, REGION_COLUMNS, REGION_ROWS))
+    sim = world_class(
+        life_type_parameters,
+        max_plants=meta['max_plants'],
+        populate=False,
+        width=width,
+        height=height,
+        columns=columns,
+        rows=rows,
+        num_each_life_form=meta.get('num_each_life_form', NUM_EACH_LIFE_FORM),
+        max_per_type=meta.get('max_per_type', MAX_LIFEFORMS_PER_TYPE),
+    )
+    sim.tick = meta['tick']
+    sim.winner_type = meta['winner_type']
+    if meta['winning_parameters'] is not None:
+        sim.winning_parameters = {
+            'pixels': _pixels_from_json(meta['winning_parameters']['pixels']),
+            'attributes': meta['winning_parameters']['attributes'],
+        }
+
+    # Plants, added in bucket order so every grid cell lists them as before
+    plants = []
+    for x, y, energy in zip(values['plant_x'], values['plant_y'], values['plant_energy']):
+        plant = Plant((x, y))
+        plant.energy = energy
+        sim.add_plant(plant)
+        plants.append(plant)
+
+    # Life forms in update order; their random draws here are undone by restoring the stream below
+    genomes = [intern_genome(_pixels_from_json(pixels)) for pixels in meta['genomes']]
+    life_forms = []
+    for x, y, direction, energy, cooldown, type_id, genome in zip(
+        values['x'], values['y'], values['direction'], values['energy'],
+        values['cooldown'], values['type'], values['genome'],
+    ):
+        life_form = LifeForm(sim.life_types[type_id], position=[x, y], genome=genomes[genome], rng=sim.rng)
+        life_form.direction = direction
+        life_form.energy = energy
+        life_form.reproduction_cooldown = cooldown
+        life_forms.append(life_form)
+        sim.population[life_form.life_type] += 1
+        sim.stats[life_form.life_type].add(life_form)
+    sim.life_forms = life_forms
+    sim.surviving_types = {life_type for life_type, count in sim.population.items() if count}
+
+    # Fill the life form index in its saved bucket order
+    for slot in values['index_order']:
+        sim.life_form_index.insert(life_forms[slot], life_forms[slot].rect.center)
+
+    for life_form, kind, target in zip(life_forms, values['target_kind'], values['target']):
+        if kind == PLANT_TARGET:
+            life_form.target = plants[target]
+        elif kind == LIFE_FORM_TARGET:
+            life_form.target = life_forms[target]
+
+    # Examples that have died since are shown from a detached copy
+    for life_type, (slot, genome) in meta['examples'].items():
+        if slot >= 0:
+            sim.life_form_examples[life_type] = life_forms[slot]
+        else:
+            example = LifeForm(life_type, position=[0.0, 0.0], genome=genomes[genome], rng=sim.rng)
+            example.alive = False
+            sim.life_form_examples[life_type] = example
+
+    rng_version, gauss_next = meta['rng']
+    sim.rng.setstate((rng_version, tuple(values['rng_state']), gauss_next))
+    if seed is not None:
+        sim.rng.seed(seed)
+    return sim
+
+
+# Function to save a snapshot; the file is replaced atomically so a crash never leaves half a checkpoint
+def save_snapshot(sim, path):
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, 'wb') as snapshot_file:
+        snapshot_file.write(snapshot_bytes(sim))
+    os.replace(temporary_path, path)
+
+
+# Function to load a snapshot file through a memory map
+def load_snapshot(path, seed=None):
+    with open(path, 'rb') as snapshot_file:
+        with mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return restore_snapshot(data, seed)
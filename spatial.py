@@ -0,0 +1,71 @@
+import math
+
+
+class SpatialHash:
+    """
+    Uniform grid that buckets objects by position, so neighborhood queries
+    only look at the cells around a point instead of the whole world.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        # (cell_x, cell_y) -> insertion-ordered dict used as a set of items
+        self.cells = {}
+        # item -> the cell it is currently stored in
+        self.item_cells = {}
+
+    def __len__(self):
+        return len(self.item_cells)
+
+    def __contains__(self, item):
+        return item in self.item_cells
+
+    def cell_of(self, position):
+        return (math.floor(position[0] / self.cell_size), math.floor(position[1] / self.cell_size))
+
+    def insert(self, item, position):
+        cell = self.cell_of(position)
+        self.item_cells[item] = cell
+        bucket = self.cells.get(cell)
+        if bucket is None:
+            bucket = self.cells[cell] = {}
+        bucket[item] = None
+
+    def remove(self, item):
+        cell = self.item_cells.pop(item, None)
+        if cell is None:
+            return
+        bucket = self.cells[cell]
+        del bucket[item]
+        if not bucket:
+            del self.cells[cell]
+
+    def move(self, item, position):
+        # Only touch the buckets when the item actually changed cell
+        cell = self.cell_of(position)
+        old_cell = self.item_cells.get(item)
+        if cell == old_cell:
+            return
+        if old_cell is not None:
+            self.remove(item)
+        self.insert(item, position)
+
+    def clear(self):
+        self.cells.clear()
+        self.item_cells.clear()
+
+    def query(self, position, radius):
+        """
+        Return every item stored in a cell overlapping the square of half-size
+        radius around position. Callers still apply their exact distance test.
+        """
+        min_cx, min_cy = self.cell_of((position[0] - radius, position[1] - radius))
+        max_cx, max_cy = self.cell_of((position[0] + radius, position[1] + radius))
+        cells = self.cells
+        found = []
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    found.extend(bucket)
+        return found
@@ -0,0 +1,32 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from replay import KEYFRAME_TICKS, ReplayRecorder, load_replay
+from simulation import Simulation
+
+
+# Function to describe what a live or replayed world shows
+def frame(world):
+    life_forms = [(life_form.life_type, life_form.genome, life_form.rect.topleft) for life_form in world.life_forms]
+    return life_forms, sorted(plant.position for plant in world.plants)
+
+
+def test_replay_matches_game(tmp_path):
+    sim = Simulation(seed=1)
+    path = str(tmp_path / 'game.replay')
+    recorder = ReplayRecorder(sim, path)
+    frames = {}
+    for _ in range(2 * KEYFRAME_TICKS + 100):
+        sim.step()
+        frames[sim.tick] = frame(sim)
+    recorder.close()
+
+    replay = load_replay(path)
+    while replay.advance():
+        assert frame(replay) == frames[replay.tick]
+    # Backwards, into another block and forwards within one
+    for tick in (KEYFRAME_TICKS + 50, 30, 40, 2 * KEYFRAME_TICKS + 1):
+        replay.seek(tick)
+        assert frame(replay) == frames[tick]
@@ -0,0 +1,26 @@
+import os
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sharded import ShardedSimulation
+from simulation import Simulation
+
+
+# Function to play a small sharded game, checking the shards' populations as it goes
+def play(seed):
+    sim = Simulation(seed=3, width=1800, height=960, columns=4, rows=4, num_each_life_form=10)
+    with ShardedSimulation(sim, shards=2, seed=seed) as game:
+        for _ in range(4):
+            game.step(50)
+            records = game.life_form_records()
+            assert len({record[0] for record in records}) == len(records)
+            assert Counter(record[1] for record in records) == Counter(
+                {life_type: count for life_type, count in game.population.items() if count}
+            )
+        return game.tick, game.population, sorted(records)
+
+
+def test_same_seed_same_game():
+    assert play(5) == play(5)
@@ -0,0 +1,54 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simulation import LifeForm, Plant, Simulation
+
+# Function to list the contacts of a world by comparing each life form with all others, in update order
+def all_contacts(sim):
+    alive = [life_form for life_form in sim.life_forms if life_form.alive]
+    touching = [
+        (life_form, life_form.target) for life_form in alive
+        if life_form.target is not None and life_form.target.alive and life_form.rect.colliderect(life_form.target.rect)
+    ]
+    matings = []
+    for life_form in alive:
+        if life_form.ready_to_mate(sim):
+            partners = [
+                other for other in alive
+                if other is not life_form and other.life_type == life_form.life_type
+                and not other.reproduction_cooldown and life_form.rect.colliderect(other.rect)
+            ]
+            if partners:
+                matings.append((life_form, partners))
+    return (
+        [pair for pair in touching if isinstance(pair[1], Plant)],
+        [pair for pair in touching if isinstance(pair[1], LifeForm)],
+        matings,
+    )
+
+
+def test_contacts_found_in_update_order():
+    sim = Simulation(seed=3)
+    kinds_found = set()
+
+    # The contacts are checked where the contact stage looks for them, once everyone has moved
+    def find_contacts():
+        contacts = Simulation.find_contacts(sim)
+        assert contacts == all_contacts(sim)
+        kinds_found.update(kind for kind, found in enumerate(contacts) if found)
+        return contacts
+
+    sim.find_contacts = find_contacts
+    sim.step(600)
+    assert kinds_found == {0, 1, 2}
+
+
+def test_same_seed_same_game():
+    games = []
+    for _ in range(2):
+        sim = Simulation(seed=1)
+        sim.step(1500)
+        games.append((sim.winner_type, sorted(sim.population.items()), [lf.energy for lf in sim.life_forms]))
+    assert games[0] == games[1]
@@ -0,0 +1,31 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simulation import Simulation
+from snapshot import load_snapshot, save_snapshot
+
+
+# Function to describe what a world holds, for comparing two worlds
+def world_state(sim):
+    life_forms = [
+        (life_form.life_type, tuple(life_form.position), life_form.energy, life_form.reproduction_cooldown)
+        for life_form in sim.life_forms
+    ]
+    return sim.tick, life_forms, sorted(plant.position for plant in sim.plants)
+
+
+def test_resume_and_fork(tmp_path):
+    sim = Simulation(seed=2)
+    sim.step(300)
+    path = str(tmp_path / 'world.snapshot')
+    save_snapshot(sim, path)
+    resumed = load_snapshot(path)
+    forked = load_snapshot(path, seed=7)
+    assert world_state(resumed) == world_state(sim)
+
+    for world in (sim, resumed, forked):
+        world.step(500)
+    assert world_state(resumed) == world_state(sim)
+    assert world_state(forked) != world_state(sim)
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip('numpy')
+
+from vectorized import VectorizedSimulation
+
+
+# Function to run a small seeded game and return what it ended with
+def play(seed):
+    sim = VectorizedSimulation(seed=seed, num_each_life_form=20)
+    sim.step(200)
+    return sim.tick, sim.life_type_parameters, {life_type: int(count) for life_type, count in zip(sim.type_names, sim.type_counts)}
+
+
+def test_same_seed_same_game():
+    assert play(5) == play(5)
+
+
+def test_seed_chooses_genomes():
+    assert VectorizedSimulation(seed=1).life_type_parameters != VectorizedSimulation(seed=2).life_type_parameters
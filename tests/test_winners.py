@@ -0,0 +1,34 @@
+import csv
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from winners import ATTRIBUTES, WinnerArchive
+
+
+# Function to make winning parameters with every attribute at value
+def parameters(value):
+    return {'pixels': [(0, 0, (255, 0, 0))], 'attributes': dict.fromkeys(ATTRIBUTES, value)}
+
+
+def test_csv_import_and_streaks(tmp_path):
+    # The CSV file an archive of the same name takes over when it is created
+    with open(tmp_path / 'winners.csv', 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=['life_type', 'pixels'] + ATTRIBUTES)
+        writer.writeheader()
+        for life_type, value in (('A', 1), ('A', 2), ('B', 3)):
+            winner = parameters(value)
+            writer.writerow({'life_type': life_type, 'pixels': json.dumps(winner['pixels']), **winner['attributes']})
+
+    with WinnerArchive(str(tmp_path / 'winners.db')) as archive:
+        assert archive.latest() == ('B', parameters(3), 1)
+        archive.add('B', parameters(4))
+        archive.add_many([('B', parameters(5)), ('A', parameters(6))])
+        assert [(life_type, streak) for life_type, _, streak in archive.find()] == [
+            ('A', 1), ('B', 3), ('B', 2), ('B', 1), ('A', 2), ('A', 1),
+        ]
+        assert archive.latest() == ('A', parameters(6), 1)
+        assert archive.win_counts() == {'A': 3, 'B': 3}
+        assert [winner for _, winner, _ in archive.find('B', at_least={ATTRIBUTES[0]: 4})] == [parameters(5), parameters(4)]
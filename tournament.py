@@ -0,0 +1,204 @@
+import argparse
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from replay import ReplayRecorder
+from simulation import (
+    WIDTH,
+    HEIGHT,
+    REGION_COLUMNS,
+    REGION_ROWS,
+    NUM_EACH_LIFE_FORM,
+    MAX_LIFEFORMS_PER_TYPE,
+    Simulation,
+    choose_life_type_parameters,
+    region_life_types,
+)
+from winners import WINNERS_DB, WinnerArchive
+
+# Games longer than this many ticks are stopped without a winner
+MAX_TICKS = 50000
+
+# Seconds between progress lines
+REPORT_INTERVAL = 5
+
+
+# Function to derive the seed of one game from the tournament seed, so results
+# do not depend on which worker finishes first
+def game_seed(seed, chain, index):
+    return random.Random(f"{seed}:{chain}:{index}").getrandbits(64)
+
+
+# Function to play one headless game in a worker process, recording a replay into replays if given;
+# world holds Simulation keyword arguments such as the arena size and regions
+def play_game(chain, index, seed, winning_life_type=None, winning_parameters=None, max_ticks=MAX_TICKS, replays=None,
+              world=None):
+    start = time.perf_counter()
+    world = world or {}
+    rng = random.Random(seed)
+    types = region_life_types(world.get('columns', REGION_COLUMNS) * world.get('rows', REGION_ROWS))
+    life_type_parameters = choose_life_type_parameters(winning_life_type, winning_parameters, rng, types)
+    sim = Simulation(life_type_parameters, seed=rng.getrandbits(64), **world)
+    recorder = None
+    if replays:
+        recorder = ReplayRecorder(sim, os.path.join(replays, f"game-{chain}-{index}.replay"))
+    sim.run_until_winner(max_ticks)
+    if recorder:
+        recorder.close()
+    return {
+        'chain': chain,
+        'index': index,
+        'seed': seed,
+        'winner_type': sim.winner_type,
+        'winning_parameters': sim.winning_parameters,
+        'ticks': sim.tick,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+class Tournament:
+    """
+    Runs games on a process pool. Games are grouped in chains; like the viewer,
+    each game of a chain keeps the winner of the game before it, while chains
+    are independent of each other. Results come back to this process, which is
+    the only one writing the winner archive, in one batch per progress report.
+    """
+
+    def __init__(self, games, chains=None, workers=None, seed=None, max_ticks=MAX_TICKS, output=WINNERS_DB, replays=None,
+                 world=None):
+        self.games = games
+        # Without chains every game is independent
+        self.chains = min(chains or games, games)
+        self.workers = workers or os.cpu_count()
+        self.seed = seed if seed is not None else random.randrange(1 << 63)
+        self.max_ticks = max_ticks
+        self.output = output
+        # Directory every game's replay is written to, if any
+        self.replays = replays
+        if replays:
+            os.makedirs(replays, exist_ok=True)
+        # Simulation keyword arguments of every game, and the life types they play with
+        self.world = world or {}
+        self.life_types = region_life_types(
+            self.world.get('columns', REGION_COLUMNS) * self.world.get('rows', REGION_ROWS)
+        )
+
+        self.wins = Counter()
+        self.completed = 0
+        self.ticks = 0
+        # Winners not yet written to the archive, oldest first
+        self.unsaved_winners = []
+
+    def chain_length(self, chain):
+        # Spread the games over the chains as evenly as possible
+        return self.games // self.chains + (chain < self.games % self.chains)
+
+    def submit(self, executor, chain, index, winner_type=None, winning_parameters=None):
+        return executor.submit(
+            play_game, chain, index, game_seed(self.seed, chain, index),
+            winner_type, winning_parameters, self.max_ticks, self.replays, self.world,
+        )
+
+    def run(self, report=print):
+        """
+        Play every game and return the win counts by type (None counts games
+        that ended without a winner).
+        """
+        start = time.perf_counter()
+        last_report = start
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = {self.submit(executor, chain, 0) for chain in range(self.chains)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    self.record(result)
+                    # Continue the chain from this game's winner
+                    chain, index = result['chain'], result['index'] + 1
+                    if index < self.chain_length(chain):
+                        pending.add(self.submit(
+                            executor, chain, index, result['winner_type'], result['winning_parameters'],
+                        ))
+                now = time.perf_counter()
+                if pending and now - last_report >= REPORT_INTERVAL:
+                    self.save_winners()
+                    if report:
+                        report(self.summary(now - start))
+                    last_report = now
+        self.save_winners()
+        if report:
+            report(self.summary(time.perf_counter() - start))
+        return self.wins
+
+    def record(self, result):
+        self.completed += 1
+        self.ticks += result['ticks']
+        self.wins[result['winner_type']] += 1
+        if result['winner_type'] is not None and self.output:
+            self.unsaved_winners.append((result['winner_type'], result['winning_parameters']))
+
+    def save_winners(self):
+        if self.unsaved_winners:
+            with WinnerArchive(self.output) as archive:
+                archive.add_many(self.unsaved_winners)
+            self.unsaved_winners = []
+
+    def summary(self, elapsed):
+        elapsed = max(elapsed, 1e-9)
+        shares = ' '.join(
+            f"{life_type}:{self.wins[life_type] / self.completed:.0%}" if self.completed else f"{life_type}:-"
+            for life_type in self.life_types
+        )
+        return (
+            f"{self.completed}/{self.games} games, {self.completed / elapsed:.2f} games/s, "
+            f"{self.ticks / elapsed:.0f} ticks/s, no winner {self.wins[None]}, wins {shares}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run many headless SynthLife games in parallel.")
+    parser.add_argument('--games', type=int, default=100, help="total number of games")
+    parser.add_argument('--chains', type=int, default=None,
+                        help="number of winner lineages the games are split into (default: every game independent)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--seed', type=int, default=None, help="tournament seed, reproduces every game")
+    parser.add_argument('--max-ticks', type=int, default=MAX_TICKS, help="ticks after which a game ends without a winner")
+    parser.add_argument('--output', default=WINNERS_DB, help="winner archive the winners are appended to")
+    parser.add_argument('--replays', metavar='DIR', default=None, help="directory to record a replay of every game into")
+    parser.add_argument('--width', type=int, default=WIDTH, help="arena width in pixels")
+    parser.add_argument('--height', type=int, default=HEIGHT, help="arena height in pixels, header included")
+    parser.add_argument('--columns', type=int, default=REGION_COLUMNS, help="columns of regions, one life type each")
+    parser.add_argument('--rows', type=int, default=REGION_ROWS, help="rows of regions")
+    parser.add_argument('--life-forms', type=int, default=NUM_EACH_LIFE_FORM,
+                        help="life forms each type starts with")
+    parser.add_argument('--max-per-type', type=int, default=MAX_LIFEFORMS_PER_TYPE,
+                        help="most life forms of one type alive at once")
+    args = parser.parse_args(argv)
+
+    tournament = Tournament(
+        args.games,
+        chains=args.chains,
+        workers=args.workers,
+        seed=args.seed,
+        max_ticks=args.max_ticks,
+        output=args.output,
+        replays=args.replays,
+        world={
+            'width': args.width,
+            'height': args.height,
+            'columns': args.columns,
+            'rows': args.rows,
+            'num_each_life_form': args.life_forms,
+            'max_per_type': args.max_per_type,
+        },
+    )
+    print(f"Tournament seed {tournament.seed}, {tournament.games} games in {tournament.chains} chains "
+          f"on {tournament.workers} workers")
+    tournament.run()
+
+
+if __name__ == "__main__":
+    main()
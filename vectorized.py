@@ -0,0 +1,816 @@
+import math
+import random
+
+import numpy as np
+
+from arena import build_arena
+from simulation import (
+    WIDTH,
+    HEIGHT,
+    HEADER_HEIGHT,
+    ATTRIBUTE_COLORS,
+    NUM_PLANTS,
+    MAX_PLANTS,
+    NUM_EACH_LIFE_FORM,
+    PLANT_RESPAWN_TICKS,
+    PLANT_SIZE,
+    MAX_LIFE_FORM_SIZE,
+    GROUPING_RADIUS,
+    COHESION_WEIGHT,
+    MAX_LIFEFORMS_PER_TYPE,
+    MAX_ENERGY,
+    GAP_RATIO,
+    REGION_COLUMNS,
+    REGION_ROWS,
+    calculate_image_bounds,
+    choose_life_type_parameters,
+    region_life_types,
+)
+
+# Energy provided by a plant when consumed
+PLANT_ENERGY = 25
+
+# What target_index refers to
+NO_TARGET = 0
+PLANT_TARGET = 1
+LIFE_FORM_TARGET = 2
+
+# Per-agent arrays; they are always the same length and are compacted together
+AGENT_FIELDS = (
+    'position',
+    'center',
+    'direction',
+    'energy',
+    'cooldown',
+    'type_id',
+    'size',
+    'half_size',
+    'speed',
+    'vision',
+    'metabolism',
+    'reproduction_threshold',
+    'attack',
+    'defense',
+    'stealth',
+    'intelligence',
+    'target_kind',
+    'target_index',
+    'alive',
+)
+
+# Below this many point pairs a single dense block beats bucketing by cell
+DENSE_BLOCK_LIMIT = 1 << 16
+
+# Offsets of the 3x3 cells around a cell
+NEIGHBOR_OFFSETS = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)])
+
+
+def _cell_keys(cell_x, cell_y):
+    # Offset so neighbor cells of the arena edge stay non-negative
+    return (cell_x + 2) * (1 << 32) + (cell_y + 2)
+
+
+def cell_blocks(points_a, points_b, cell_size):
+    """
+    Group points_a by grid cell and yield (rows, columns): the indices of the
+    points_a in one cell and of every points_b in the 3x3 cells around it.
+    Every pair closer than cell_size shows up in some block, so callers can
+    work on dense rows x columns arrays and apply their exact tests there.
+    """
+    if not len(points_a) or not len(points_b):
+        return
+    if len(points_a) * len(points_b) <= DENSE_BLOCK_LIMIT:
+        yield np.arange(len(points_a)), np.arange(len(points_b))
+        return
+
+    # Sort points_b by cell and remember where each cell's run starts and ends
+    cells_b = np.floor(points_b / cell_size).astype(np.int64)
+    keys_b = _cell_keys(cells_b[:, 0], cells_b[:, 1])
+    order_b = np.argsort(keys_b, kind='stable')
+    unique_b, start_b, count_b = np.unique(keys_b[order_b], return_index=True, return_counts=True)
+    runs = dict(zip(unique_b.tolist(), zip(start_b.tolist(), (start_b + count_b).tolist())))
+
+    cells_a = np.floor(points_a / cell_size).astype(np.int64)
+    keys_a = _cell_keys(cells_a[:, 0], cells_a[:, 1])
+    order_a = np.argsort(keys_a, kind='stable')
+    _, start_a = np.unique(keys_a[order_a], return_index=True)
+    bounds_a = start_a.tolist() + [len(order_a)]
+    for (cell_x, cell_y), first, last in zip(cells_a[order_a[start_a]].tolist(), bounds_a, bounds_a[1:]):
+        pieces = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                run = runs.get(_cell_keys(cell_x + dx, cell_y + dy))
+                if run:
+                    pieces.append(order_b[run[0]:run[1]])
+        if pieces:
+            yield order_a[first:last], np.concatenate(pieces)
+
+
+def pick_one_per_group(groups, scores):
+    """
+    Return the positions in groups/scores holding the lowest score of each
+    distinct group value.
+    """
+    if not len(groups):
+        return np.empty(0, dtype=np.int64)
+    order = np.lexsort((scores, groups))
+    sorted_groups = groups[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = sorted_groups[1:] != sorted_groups[:-1]
+    return order[first]
+
+
+# Geometry tables of the arenas seen so far, see arena_tables
+_arena_tables = {}
+
+
+def _gap_table(walls):
+    # (walls, segments, intervals, 2) array of gap intervals, padded with empty (inf, -inf) ones
+    most = max((len(gaps) for segments in walls for gaps in segments), default=1)
+    table = np.full((max(len(walls), 1), len(walls[0]) if walls else 1, most, 2), (np.inf, -np.inf))
+    for wall, segments in enumerate(walls):
+        for segment, gaps in enumerate(segments):
+            table[wall, segment, :len(gaps)] = gaps
+    return table
+
+
+def arena_tables(arena):
+    """
+    Return the arena's geometry as arrays: the x and y edges of the columns
+    and rows of regions, outer edges included, and the vertical and
+    horizontal gap tables.
+    """
+    tables = _arena_tables.get(arena)
+    if tables is None:
+        tables = _arena_tables[arena] = (
+            np.array((arena.left,) + arena.wall_xs + (arena.right,), dtype=float),
+            np.array((arena.top,) + arena.wall_ys + (arena.bottom,), dtype=float),
+            _gap_table(arena.vertical_gaps),
+            _gap_table(arena.horizontal_gaps),
+        )
+    return tables
+
+
+def column_ids(arena, xs):
+    # Same as ArenaGeometry.column_of: the number of vertical walls at or left of each x
+    return np.searchsorted(arena_tables(arena)[0][1:-1], xs, side='right')
+
+
+def row_ids(arena, ys):
+    # Same as ArenaGeometry.row_of
+    return np.searchsorted(arena_tables(arena)[1][1:-1], ys, side='right')
+
+
+def region_ids(arena, points):
+    # Same numbering as ArenaGeometry.region_of
+    return row_ids(arena, points[:, 1]) * arena.columns + column_ids(arena, points[:, 0])
+
+
+def _in_gaps(table, wall, segment, values):
+    # Mask of values lying in one of the gap intervals of their wall segment
+    intervals = table[wall, segment]
+    return ((intervals[:, :, 0] <= values[:, None]) & (values[:, None] <= intervals[:, :, 1])).any(axis=1)
+
+
+def confine_all(arena, position, half_size):
+    """
+    Batched ArenaGeometry.confine: clamp every row of position in place to the
+    arena and to its region outside the gaps. Returns the mask of rows that
+    hit a boundary.
+    """
+    xs, ys, vertical_gaps, horizontal_gaps = arena_tables(arena)
+    hit = np.zeros(len(position), dtype=bool)
+    x = position[:, 0]
+    y = position[:, 1]
+    half_width = half_size[:, 0]
+    half_height = half_size[:, 1]
+    # The region is taken before any clamping
+    column = column_ids(arena, x)
+    row = row_ids(arena, y)
+
+    # Only rows reaching past the edges of their region can touch a boundary
+    near = np.flatnonzero(
+        (x - half_width < xs[column]) | (x + half_width > xs[column + 1])
+        | (y - half_height < ys[row]) | (y + half_height > ys[row + 1])
+    )
+    if not len(near):
+        return hit
+    x = x[near]
+    y = y[near]
+    half_width = half_width[near]
+    half_height = half_height[near]
+    column = column[near]
+    row = row[near]
+
+    # Outer edges
+    near_hit = y - half_height < arena.top
+    np.copyto(y, arena.top + half_height, where=near_hit)
+    m = x - half_width < arena.left
+    np.copyto(x, arena.left + half_width, where=m)
+    near_hit |= m
+    m = x + half_width > arena.right
+    np.copyto(x, arena.right - half_width, where=m)
+    near_hit |= m
+    m = y + half_height > arena.bottom
+    np.copyto(y, arena.bottom - half_height, where=m)
+    near_hit |= m
+
+    # Vertical walls on either side of the region
+    if arena.columns > 1:
+        gap_row = row_ids(arena, y)
+        right = np.minimum(column, arena.columns - 2)
+        wall = xs[right + 1]
+        m = (column < arena.columns - 1) & (x + half_width > wall) & ~_in_gaps(vertical_gaps, right, gap_row, y)
+        np.copyto(x, wall - half_width, where=m)
+        near_hit |= m
+        left = np.maximum(column - 1, 0)
+        wall = xs[left + 1]
+        m = (column > 0) & (x - half_width < wall) & ~_in_gaps(vertical_gaps, left, gap_row, y)
+        np.copyto(x, wall + half_width, where=m)
+        near_hit |= m
+
+    # Horizontal walls above and below the region
+    if arena.rows > 1:
+        gap_column = column_ids(arena, x)
+        below = np.minimum(row, arena.rows - 2)
+        wall = ys[below + 1]
+        m = (row < arena.rows - 1) & (y + half_height > wall) & ~_in_gaps(horizontal_gaps, below, gap_column, x)
+        np.copyto(y, wall - half_height, where=m)
+        near_hit |= m
+        above = np.maximum(row - 1, 0)
+        wall = ys[above + 1]
+        m = (row > 0) & (y - half_height < wall) & ~_in_gaps(horizontal_gaps, above, gap_column, x)
+        np.copyto(y, wall + half_height, where=m)
+        near_hit |= m
+
+    position[near, 0] = x
+    position[near, 1] = y
+    hit[near] = near_hit
+    return hit
+
+
+def rects_overlap(center_a, size_a, center_b, size_b):
+    # Same test as Rect.colliderect for rects placed by their integer centers;
+    # the last axis holds (x, y) and the others broadcast
+    left_a = center_a - size_a // 2
+    left_b = center_b - size_b // 2
+    return np.all((left_a < left_b + size_b) & (left_b < left_a + size_a), axis=-1)
+
+
+def pairwise_sq_distance(points_a, points_b):
+    # Matrix of squared distances between every points_a row and every points_b row
+    dx = points_a[:, None, 0] - points_b[None, :, 0]
+    dy = points_a[:, None, 1] - points_b[None, :, 1]
+    return dx * dx + dy * dy
+
+
+def unit_vectors(vectors):
+    # Normalize rows, leaving zero-length rows at zero
+    length = np.hypot(vectors[:, 0], vectors[:, 1])
+    length[length == 0] = 1
+    return vectors / length[:, None]
+
+
+def move_agents(position, direction, speed, target, seeking, centroid, grouped, threat, fleeing, rng):
+    """
+    Movement stage for every life form in one batched pass.
+
+    Rows with seeking set head for target at full speed, plus a
+    COHESION_WEIGHT pull towards centroid where grouped is set; fleeing rows
+    then also step away from threat. All other rows wander along direction,
+    which about one in ten of them turns by up to half a radian. Returns the
+    new positions and directions.
+    """
+    count = len(position)
+
+    # Random heading jitter of the wanderers
+    turn = ~seeking & (rng.random(count) < 0.1)
+    direction = direction + np.where(turn, rng.uniform(-0.5, 0.5, count), 0)
+    heading = np.column_stack((np.cos(direction), np.sin(direction)))
+
+    # Seek or wander, then cohesion towards the group
+    step = np.where(seeking[:, None], unit_vectors(target - position), heading) * speed[:, None]
+    step += np.where(grouped[:, None], unit_vectors(centroid - position), 0) * COHESION_WEIGHT
+    position = position + step
+
+    # Move away from the threat, starting from the new position
+    position += np.where(fleeing[:, None], unit_vectors(position - threat), 0) * speed[:, None]
+    return position, direction
+
+
+class VectorizedSimulation:
+    """
+    Structure-of-arrays counterpart of Simulation. Every life form is a row
+    in a set of NumPy arrays and each tick advances all of them at once.
+
+    Life forms are updated synchronously from the state at the start of the
+    tick instead of one after another, so individual games differ from
+    Simulation while following the same rules.
+    """
+
+    def __init__(
+        self,
+        life_type_parameters=None,
+        seed=None,
+        num_each_life_form=NUM_EACH_LIFE_FORM,
+        max_per_type=MAX_LIFEFORMS_PER_TYPE,
+        num_plants=NUM_PLANTS,
+        max_plants=MAX_PLANTS,
+        width=WIDTH,
+        height=HEIGHT,
+        columns=REGION_COLUMNS,
+        rows=REGION_ROWS,
+    ):
+        # Walls and gaps between the regions
+        self.arena = build_arena(width, height, HEADER_HEIGHT, GAP_RATIO, columns, rows)
+
+        if life_type_parameters is None:
+            # Genomes come from the seed too, so a seed reproduces the whole game
+            life_type_parameters = choose_life_type_parameters(
+                rng=random.Random(seed), types=region_life_types(self.arena.regions),
+            )
+        if len(life_type_parameters) > self.arena.regions:
+            raise ValueError(f"{len(life_type_parameters)} life types do not fit in {self.arena.regions} regions")
+        self.life_type_parameters = life_type_parameters
+        self.rng = np.random.default_rng(seed)
+        self.max_per_type = max_per_type
+        self.max_plants = max_plants
+
+        self.tick = 0
+        self.winner_type = None
+        self.winning_parameters = None
+
+        # Per-type tables of the attributes derived from each genome
+        self.type_names = list(life_type_parameters)
+        num_types = len(self.type_names)
+        self.type_attributes = np.zeros((num_types, len(ATTRIBUTE_COLORS)))
+        self.type_size = np.zeros((num_types, 2), dtype=np.int64)
+        for type_id, life_type in enumerate(self.type_names):
+            params = life_type_parameters[life_type]
+            self.type_attributes[type_id] = [params['attributes'].get(attr, 0) for attr in ATTRIBUTE_COLORS]
+            self.type_size[type_id] = calculate_image_bounds(params['pixels'])[0]
+        column = {attr: index for index, attr in enumerate(ATTRIBUTE_COLORS)}
+        attrs = self.type_attributes
+        self.type_speed = 1 + attrs[:, column['speed']] * 0.5
+        self.type_vision = 100 + attrs[:, column['vision_range']] * 10
+        self.type_metabolism = np.array([round((5 - m) / 2.5) for m in attrs[:, column['metabolism_rate']]], dtype=float)
+        self.type_reproduction_threshold = 200 + attrs[:, column['energy_storage']] * 10
+        self.type_attack = attrs[:, column['attack_power']]
+        self.type_defense = attrs[:, column['defense']]
+        self.type_stealth = attrs[:, column['stealth']]
+        self.type_intelligence = attrs[:, column['intelligence']]
+
+        # Cell size for vision and grouping queries
+        self.cell_size = max(float(self.type_vision.max()), GROUPING_RADIUS)
+
+        # Plants live in fixed slots; eaten slots are reused by new plants
+        self.plant_position = np.zeros((max_plants, 2), dtype=np.int64)
+        self.plant_alive = np.zeros(max_plants, dtype=bool)
+        # Grid cell of each plant slot, plants never move
+        self.plant_cell = np.zeros((max_plants, 2), dtype=np.int64)
+        self.grid_shape = (
+            int(np.floor(self.arena.right / self.cell_size)) + 1,
+            int(np.floor(self.arena.bottom / self.cell_size)) + 1,
+        )
+        self.spawn_plants(num_plants)
+
+        # Spawn initial life forms in their own region
+        self._clear_agents()
+        type_ids = []
+        positions = []
+        for type_id in range(len(self.type_names)):
+            region_start, region_end = self.arena.region_area(type_id)
+            xs = self.rng.integers(region_start[0], region_end[0], num_each_life_form)
+            ys = self.rng.integers(region_start[1], region_end[1], num_each_life_form)
+            type_ids.append(np.full(num_each_life_form, type_id))
+            positions.append(np.column_stack((xs, ys)).astype(float))
+        type_ids = np.concatenate(type_ids)
+        self._append_agents(type_ids, np.concatenate(positions), np.full(len(type_ids), 200.0))
+        self.type_counts = np.bincount(self.type_id, minlength=num_types)
+
+    def _clear_agents(self):
+        self.position = np.zeros((0, 2))
+        self.center = np.zeros((0, 2), dtype=np.int64)
+        self.size = np.zeros((0, 2), dtype=np.int64)
+        self.half_size = np.zeros((0, 2))
+        for field in ('direction', 'energy', 'speed', 'vision', 'metabolism', 'reproduction_threshold',
+                      'attack', 'defense', 'stealth', 'intelligence'):
+            setattr(self, field, np.zeros(0))
+        for field in ('cooldown', 'type_id', 'target_kind', 'target_index'):
+            setattr(self, field, np.zeros(0, dtype=np.int64))
+        self.alive = np.zeros(0, dtype=bool)
+
+    def _append_agents(self, type_ids, positions, energy):
+        count = len(type_ids)
+        new = {
+            'position': positions,
+            'center': np.floor(positions).astype(np.int64),
+            'direction': self.rng.uniform(0, 2 * math.pi, count),
+            'energy': energy,
+            'cooldown': np.zeros(count, dtype=np.int64),
+            'type_id': type_ids,
+            'size': self.type_size[type_ids],
+            'half_size': self.type_size[type_ids] / 2,
+            'speed': self.type_speed[type_ids],
+            'vision': self.type_vision[type_ids],
+            'metabolism': self.type_metabolism[type_ids],
+            'reproduction_threshold': self.type_reproduction_threshold[type_ids],
+            'attack': self.type_attack[type_ids],
+            'defense': self.type_defense[type_ids],
+            'stealth': self.type_stealth[type_ids],
+            'intelligence': self.type_intelligence[type_ids],
+            'target_kind': np.full(count, NO_TARGET, dtype=np.int64),
+            'target_index': np.zeros(count, dtype=np.int64),
+            'alive': np.ones(count, dtype=bool),
+        }
+        for field in AGENT_FIELDS:
+            setattr(self, field, np.concatenate((getattr(self, field), new[field])))
+
+    def add_life_forms(self, life_types, positions):
+        """
+        Add life forms of the given types at the given [x, y] positions with
+        the usual starting energy, e.g. to lay out a world created with
+        num_each_life_form=0.
+        """
+        type_ids = np.array([self.type_names.index(life_type) for life_type in life_types], dtype=np.int64)
+        self._append_agents(type_ids, np.asarray(positions, dtype=float).reshape(-1, 2), np.full(len(type_ids), 200.0))
+        self.type_counts = np.bincount(self.type_id, minlength=len(self.type_names))
+
+    def __len__(self):
+        return len(self.type_id)
+
+    @property
+    def population(self):
+        return {life_type: int(count) for life_type, count in zip(self.type_names, self.type_counts)}
+
+    def spawn_plant(self):
+        self.spawn_plants(1)
+
+    def spawn_plants(self, count):
+        # Fill up to count free slots with plants at random positions
+        slots = np.flatnonzero(~self.plant_alive)[:count]
+        arena = self.arena
+        self.plant_position[slots, 0] = self.rng.integers(arena.left, arena.right + 1, len(slots))
+        self.plant_position[slots, 1] = self.rng.integers(arena.top, arena.bottom + 1, len(slots))
+        self.plant_cell[slots] = np.floor(self.plant_position[slots] / self.cell_size)
+        self.plant_alive[slots] = True
+
+    def step(self, n=1):
+        """
+        Advance the world by n ticks, stopping early once a winner is found.
+        """
+        for _ in range(n):
+            if self.finished:
+                break
+            self.tick += 1
+
+            # Respawn plants at a fixed rate
+            if self.tick % PLANT_RESPAWN_TICKS == 0:
+                self.spawn_plant()
+
+            self._metabolize()
+            offspring = self._reproduce()
+            self._acquire_targets()
+            self._move_and_interact()
+            # Keep life forms in their regions, turning around at walls
+            hit = confine_all(self.arena, self.position, self.half_size)
+            self.direction[hit] = (self.direction[hit] + math.pi) % (2 * math.pi)
+
+            # Update rect positions
+            self.center = np.floor(self.position).astype(np.int64)
+
+            self._remove_dead()
+            if offspring:
+                type_ids, positions, energy = offspring
+                self._append_agents(type_ids, positions, energy)
+            self.type_counts = np.bincount(self.type_id, minlength=len(self.type_names))
+            self.check_winner()
+
+    def _metabolize(self):
+        # Energy depletion over time, and death when it runs out
+        self.energy -= 0.05 * self.metabolism
+        self.alive &= self.energy > 0
+        # Reproduction cooldown logic
+        self.cooldown[self.alive & (self.cooldown > 0)] -= 1
+
+    def _reproduce(self):
+        eligible = np.flatnonzero(
+            self.alive
+            & (self.cooldown == 0)
+            & (self.energy >= self.reproduction_threshold)
+            & (self.type_counts[self.type_id] < self.max_per_type)
+        )
+        if not len(eligible):
+            return None
+
+        # Choose one same-type life form in contact, which must be off cooldown
+        proposers = []
+        partners = []
+        for rows, columns in cell_blocks(self.center[eligible], self.center, MAX_LIFE_FORM_SIZE):
+            i = eligible[rows]
+            contact = (
+                (columns[None, :] != i[:, None])
+                & self.alive[columns][None, :]
+                & (self.type_id[columns][None, :] == self.type_id[i][:, None])
+                & rects_overlap(
+                    self.center[i][:, None], self.size[i][:, None],
+                    self.center[columns][None, :], self.size[columns][None, :],
+                )
+            )
+            scores = np.where(contact, self.rng.random(contact.shape), np.inf)
+            best = np.argmin(scores, axis=1)
+            found = contact.any(axis=1)
+            proposers.append(i[found])
+            partners.append(columns[best[found]])
+        if not proposers:
+            return None
+        i = np.concatenate(proposers)
+        partner = np.concatenate(partners)
+        ready = self.cooldown[partner] == 0
+        i, partner = i[ready], partner[ready]
+
+        # Matings are few, so they are settled one by one in random order;
+        # nobody mates twice in a tick and the per-type cap is respected
+        population = self.type_counts.copy()
+        used = set()
+        offspring_types = []
+        offspring_positions = []
+        offspring_energy = []
+        for k in self.rng.permutation(len(i)):
+            a, b = int(i[k]), int(partner[k])
+            if a in used or b in used:
+                continue
+            type_id = self.type_id[a]
+            offspring_allowed = self.max_per_type - population[type_id]
+            if offspring_allowed >= 2:
+                parents = (a, b)
+                energy_contribution = min(self.energy[a], self.energy[b]) / 3
+            elif offspring_allowed == 1:
+                parents = (a,)
+                energy_contribution = min(self.energy[a], self.energy[b]) / 4
+            else:
+                continue
+            self.energy[a] -= energy_contribution
+            self.energy[b] -= energy_contribution
+            self.cooldown[a] = 300
+            self.cooldown[b] = 300
+            used.update((a, b))
+            population[type_id] += len(parents)
+            for parent in parents:
+                offspring_types.append(type_id)
+                offspring_positions.append(self.position[parent].copy())
+                offspring_energy.append(min(energy_contribution, MAX_ENERGY))
+
+        if not offspring_types:
+            return None
+        return (
+            np.array(offspring_types, dtype=np.int64),
+            np.array(offspring_positions),
+            np.array(offspring_energy),
+        )
+
+    def _lost_targets(self):
+        # Life forms whose target plant was eaten or whose target life form died
+        kind = self.target_kind
+        index = self.target_index
+        on_plant = kind == PLANT_TARGET
+        on_life_form = kind == LIFE_FORM_TARGET
+        lost = on_plant & ~self.plant_alive[np.where(on_plant, index, 0)]
+        lost |= on_life_form & ~self.alive[np.where(on_life_form, index, 0)]
+        return lost
+
+    def _acquire_targets(self):
+        # Drop targets that died or were eaten
+        kind = self.target_kind
+        kind[self._lost_targets()] = NO_TARGET
+
+        seekers = np.flatnonzero(self.alive & (kind == NO_TARGET))
+        if not len(seekers):
+            return
+        position = self.position[seekers]
+        vision_sq = self.vision[seekers] ** 2
+        region = region_ids(self.arena, position)
+
+        intelligent = self.intelligence[seekers] > 0
+        best_score = np.full(len(seekers), np.inf)
+        best_kind = np.full(len(seekers), NO_TARGET)
+        best_target = np.zeros(len(seekers), dtype=np.int64)
+
+        def offer(rows, columns, visible, sq_distance, kind):
+            # Intelligent life forms take the nearest target, others a random one
+            scores = np.where(intelligent[rows][:, None], sq_distance, self.rng.random(sq_distance.shape))
+            scores[~visible] = np.inf
+            best = np.argmin(scores, axis=1)
+            score = scores[np.arange(len(rows)), best]
+            better = score < best_score[rows]
+            rows = rows[better]
+            best_score[rows] = score[better]
+            best_kind[rows] = kind
+            best_target[rows] = columns[best[better]]
+
+        # Plants within vision range and same region; only plants in the
+        # 3x3 cells around some seeker can be in range
+        plant_alive = self.plant_alive
+        if len(seekers) * self.max_plants > DENSE_BLOCK_LIMIT:
+            near = np.zeros(self.grid_shape, dtype=bool)
+            seeker_cells = np.floor(position / self.cell_size).astype(np.int64)
+            near_cells = np.clip(seeker_cells[:, None, :] + NEIGHBOR_OFFSETS, 0, np.array(self.grid_shape) - 1)
+            near[near_cells[..., 0], near_cells[..., 1]] = True
+            plant_alive = plant_alive & near[self.plant_cell[:, 0], self.plant_cell[:, 1]]
+        plant_slots = np.flatnonzero(plant_alive)
+        plant_position = self.plant_position[plant_slots].astype(float)
+        plant_region = region_ids(self.arena, plant_position)
+        for rows, columns in cell_blocks(position, plant_position, self.cell_size):
+            sq_distance = pairwise_sq_distance(position[rows], plant_position[columns])
+            visible = (
+                (sq_distance <= vision_sq[rows][:, None])
+                & (plant_region[columns][None, :] == region[rows][:, None])
+            )
+            offer(rows, plant_slots[columns], visible, sq_distance, PLANT_TARGET)
+
+        # Other life forms within vision range and same region
+        center = self.center.astype(float)
+        center_region = region_ids(self.arena, center)
+        for rows, columns in cell_blocks(position, center, self.cell_size):
+            i = seekers[rows]
+            # Cells are usually held by one type in one region, so drop the
+            # candidates that cannot qualify before building the block
+            keep = self.alive[columns]
+            row_types = self.type_id[i]
+            if (row_types == row_types[0]).all():
+                keep &= self.type_id[columns] != row_types[0]
+            row_regions = region[rows]
+            if (row_regions == row_regions[0]).all():
+                keep &= center_region[columns] == row_regions[0]
+            columns = columns[keep]
+            if not len(columns):
+                continue
+            sq_distance = pairwise_sq_distance(position[rows], center[columns])
+            visible = (
+                self.alive[columns][None, :]
+                & (self.type_id[columns][None, :] != self.type_id[i][:, None])
+                & (sq_distance <= vision_sq[rows][:, None])
+                & (center_region[columns][None, :] == region[rows][:, None])
+            )
+            # Stealth and intelligence affect detection, rolled only for visible pairs
+            seen_row, seen_column = np.nonzero(visible)
+            detection_chance = 1 - self.stealth[columns[seen_column]] * 0.05 + self.intelligence[i[seen_row]] * 0.05
+            visible[seen_row, seen_column] = self.rng.random(len(seen_row)) < detection_chance
+            offer(rows, columns, visible, sq_distance, LIFE_FORM_TARGET)
+
+        found = best_kind != NO_TARGET
+        self.target_kind[seekers[found]] = best_kind[found]
+        self.target_index[seekers[found]] = best_target[found]
+
+    def _move_and_interact(self):
+        alive = self.alive
+        count = len(alive)
+        seeking = alive & (self.target_kind != NO_TARGET)
+        rows = np.flatnonzero(seeking)
+
+        # Rect centers of the targets, as they were at the start of the tick
+        is_plant = self.target_kind[rows] == PLANT_TARGET
+        target_index = self.target_index[rows]
+        target_center = np.where(
+            is_plant[:, None],
+            self.plant_position[np.where(is_plant, target_index, 0)],
+            self.center[np.where(is_plant, 0, target_index)],
+        )
+        target = np.zeros((count, 2))
+        target[rows] = target_center
+
+        centroid, grouped = self._group_centroids(rows)
+
+        # Contacts are judged on the rects from the previous tick, so all
+        # interactions can be settled before anyone moves
+        target_size = np.where(is_plant[:, None], PLANT_SIZE, self.size[np.where(is_plant, 0, target_index)])
+        touching = rects_overlap(self.center[rows], self.size[rows], target_center, target_size)
+        self._eat(rows[touching & is_plant])
+        fleeing, threat = self._encounter(rows[touching & ~is_plant])
+
+        self.position, self.direction = move_agents(
+            self.position, self.direction, self.speed,
+            target, seeking, centroid, grouped, threat, fleeing, self.rng,
+        )
+
+    def _group_centroids(self, rows):
+        """
+        Centroid of the same-type life forms within GROUPING_RADIUS of each of
+        the given rows, as full-length arrays with a mask of rows that have one.
+        """
+        count = len(self.alive)
+        neighbors = np.zeros(count)
+        total = np.zeros((count, 2))
+        for block_rows, columns in cell_blocks(self.position[rows], self.position, self.cell_size):
+            i = rows[block_rows]
+            near = (
+                (columns[None, :] != i[:, None])
+                & self.alive[columns][None, :]
+                & (self.type_id[columns][None, :] == self.type_id[i][:, None])
+                & (pairwise_sq_distance(self.position[i], self.position[columns]) <= GROUPING_RADIUS ** 2)
+            )
+            neighbors[i] = near.sum(axis=1)
+            total[i] = near @ self.position[columns]
+        grouped = neighbors > 0
+        total[grouped] /= neighbors[grouped, None]
+        return total, grouped
+
+    def _eat(self, eaters):
+        # When several reach the same plant, one of them gets it
+        if not len(eaters):
+            return
+        eaten = self.target_index[eaters]
+        first = pick_one_per_group(eaten, self.rng.random(len(eaters)))
+        eaters, eaten = eaters[first], eaten[first]
+        self.energy[eaters] = np.minimum(self.energy[eaters] + PLANT_ENERGY, MAX_ENERGY)
+        self.plant_alive[eaten] = False
+        kind = self.target_kind
+        kind[eaters] = NO_TARGET
+        kind[self._lost_targets() & (kind == PLANT_TARGET)] = NO_TARGET
+
+    def _encounter(self, hunters):
+        """
+        Settle fights between hunters and their prey. Returns the full-length
+        mask of hunters that flee instead, and the positions they flee from.
+        """
+        count = len(self.alive)
+        fleeing = np.zeros(count, dtype=bool)
+        threat = np.zeros((count, 2))
+        prey = self.target_index[hunters]
+        hunters, prey = hunters[self.alive[prey]], prey[self.alive[prey]]
+        if not len(hunters):
+            return fleeing, threat
+
+        # Decide to fight or flee based on intelligence
+        my_power = self.attack[hunters] + self.defense[hunters]
+        other_power = self.attack[prey] + self.defense[prey]
+        fights = np.where(
+            self.intelligence[hunters] > 0,
+            my_power >= other_power,
+            self.rng.random(len(hunters)) < 0.5,
+        )
+
+        # Combat resolution
+        attackers, defenders = hunters[fights], prey[fights]
+        my_attack = self.attack[attackers] + self.rng.integers(0, 6, len(attackers))
+        other_attack = self.attack[defenders] + self.rng.integers(0, 6, len(attackers))
+        np.subtract.at(self.energy, defenders, np.maximum(0, my_attack - self.defense[defenders]))
+        np.subtract.at(self.energy, attackers, np.maximum(0, other_attack - self.defense[attackers]))
+        self.alive &= self.energy > 0
+
+        fleeing[hunters[~fights]] = True
+        threat[hunters[~fights]] = self.position[prey[~fights]]
+        return fleeing, threat
+
+    def _remove_dead(self):
+        keep = self.alive
+        if keep.all():
+            return
+        # Map old rows to new ones so life form targets stay valid
+        new_index = np.full(len(keep), -1, dtype=np.int64)
+        new_index[keep] = np.arange(np.count_nonzero(keep))
+        targets_life_form = self.target_kind == LIFE_FORM_TARGET
+        remapped = new_index[self.target_index[targets_life_form]]
+        self.target_index[targets_life_form] = np.maximum(remapped, 0)
+        self.target_kind[np.flatnonzero(targets_life_form)[remapped < 0]] = NO_TARGET
+        for field in AGENT_FIELDS:
+            setattr(self, field, getattr(self, field)[keep])
+
+    def run_until_winner(self, max_ticks=None):
+        """
+        Step until only one life type remains (or max_ticks have passed) and
+        return the winning type, or None if there is none.
+        """
+        while not self.finished:
+            if max_ticks is not None and self.tick >= max_ticks:
+                break
+            self.step()
+        return self.winner_type
+
+    @property
+    def finished(self):
+        return self.winner_type is not None or not len(self)
+
+    def check_winner(self):
+        # Check if only one type of life form remains
+        remaining = np.flatnonzero(self.type_counts)
+        if len(remaining) == 1:
+            self.winner_type = self.type_names[remaining[0]]
+            self.winning_parameters = self.life_type_parameters[self.winner_type]
+
+    def average_attributes(self, life_type):
+        # All members of a type share its genome
+        type_id = self.type_names.index(life_type)
+        if not self.type_counts[type_id]:
+            return {}
+        return {attr: float(value) for attr, value in zip(ATTRIBUTE_COLORS, self.type_attributes[type_id])}
+
+    def calculate_energy_metrics(self):
+        num_types = len(self.type_names)
+        totals = np.bincount(self.type_id, weights=self.energy, minlength=num_types)
+        energy_metrics = {}
+        for type_id, life_type in enumerate(self.type_names):
+            count = self.type_counts[type_id]
+            total_energy = float(totals[type_id])
+            energy_metrics[life_type] = {'total': total_energy, 'average': total_energy / count if count else 0}
+        return energy_metrics
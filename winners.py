@@ -0,0 +1,243 @@
+import argparse
+import csv
+import json
+import os
+import pathlib
+import sqlite3
+from contextlib import contextmanager
+
+from simulation import ATTRIBUTE_COLORS
+
+# Database the winners of all games are archived in
+WINNERS_DB = 'winning_parameters.db'
+
+# File the winners used to be appended to; a new database imports the CSV file of the same name
+WINNERS_CSV = 'winning_parameters.csv'
+
+# Seconds a writer waits for another process to finish its transaction
+BUSY_TIMEOUT = 30
+
+# Attribute columns, in CSV order
+ATTRIBUTES = list(ATTRIBUTE_COLORS.keys())
+
+CREATE_TABLE = f"""
+CREATE TABLE IF NOT EXISTS winners (
+    id INTEGER PRIMARY KEY,
+    life_type TEXT NOT NULL,
+    pixels TEXT NOT NULL,
+    streak INTEGER NOT NULL,
+    {', '.join(f'{attr} INTEGER NOT NULL' for attr in ATTRIBUTES)}
+)
+"""
+
+INSERT_WINNER = (
+    f"INSERT INTO winners (life_type, pixels, streak, {', '.join(ATTRIBUTES)}) "
+    f"VALUES ({', '.join('?' * (len(ATTRIBUTES) + 3))})"
+)
+
+SELECT_WINNER = f"SELECT life_type, pixels, streak, {', '.join(ATTRIBUTES)} FROM winners"
+
+
+# Function to turn a row selected with SELECT_WINNER into (life_type, parameters, streak)
+def _winner_from_row(row):
+    life_type, pixels, streak = row[:3]
+    pixels = [(x, y, tuple(color)) for x, y, color in json.loads(pixels)]
+    attributes = dict(zip(ATTRIBUTES, row[3:]))
+    return life_type, {'pixels': pixels, 'attributes': attributes}, streak
+
+
+# Function to read the (life_type, parameters) pairs of a winners CSV file, oldest first
+def read_winners_csv(path):
+    with open(path, 'r', newline='') as csvfile:
+        for row in csv.DictReader(csvfile):
+            attributes = {attr: int(row.get(attr) or 0) for attr in ATTRIBUTES}
+            pixels = [(x, y, tuple(color)) for x, y, color in json.loads(row.get('pixels') or '[]')]
+            yield row['life_type'], {'pixels': pixels, 'attributes': attributes}
+
+
+class WinnerArchive:
+    """
+    Winners kept in an SQLite database in WAL mode, one row per game, indexed
+    by type and by every attribute. Each row also stores the winning streak it
+    extends, so the latest winner and its streak are a single lookup of the
+    newest row however many games are stored. Several processes may write at
+    once; every batch is one transaction. A read_only archive must already
+    exist and is never created, migrated or written to.
+    """
+
+    def __init__(self, path=WINNERS_DB, read_only=False):
+        self.path = path
+        if read_only:
+            uri = pathlib.Path(path).absolute().as_uri() + '?mode=ro'
+            self.connection = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT, isolation_level=None)
+            return
+        new = not os.path.exists(path)
+        # Transactions are opened explicitly, see transaction()
+        self.connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.transaction():
+            self.connection.execute(CREATE_TABLE)
+            self.connection.execute("CREATE INDEX IF NOT EXISTS winners_life_type ON winners (life_type)")
+            for attr in ATTRIBUTES:
+                self.connection.execute(f"CREATE INDEX IF NOT EXISTS winners_{attr} ON winners ({attr})")
+
+        # Take over the winners of the CSV file this database replaces
+        legacy_csv = os.path.splitext(path)[0] + '.csv'
+        if new and os.path.exists(legacy_csv):
+            self.import_csv(legacy_csv, if_empty=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    @contextmanager
+    def transaction(self):
+        # Take the write lock up front, so the streak read and the inserts see the same newest row
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def latest(self):
+        """
+        Return (life_type, parameters, streak) of the newest winner, or
+        (None, None, 0) if there is none.
+        """
+        row = self.connection.execute(f"{SELECT_WINNER} ORDER BY id DESC LIMIT 1").fetchone()
+        if row is None:
+            return None, None, 0
+        return _winner_from_row(row)
+
+    def add(self, winner_type, winning_parameters):
+        self.add_many([(winner_type, winning_parameters)])
+
+    def add_many(self, winners):
+        """
+        Append (life_type, parameters) pairs, oldest first, in one transaction.
+        Returns the number of winners added.
+        """
+        with self.transaction():
+            return self._insert(winners)
+
+    def _insert(self, winners):
+        newest = self.connection.execute("SELECT life_type, streak FROM winners ORDER BY id DESC LIMIT 1").fetchone()
+        last_type, streak = newest if newest else (None, 0)
+        count = 0
+
+        # Rows are produced as they are inserted, so importing a huge CSV file needs little memory
+        def rows():
+            nonlocal last_type, streak, count
+            for winner_type, winning_parameters in winners:
+                streak = streak + 1 if winner_type == last_type else 1
+                last_type = winner_type
+                count += 1
+                attributes = winning_parameters['attributes']
+                yield (
+                    winner_type,
+                    json.dumps(winning_parameters['pixels'], separators=(',', ':')),
+                    streak,
+                    *(attributes.get(attr, 0) for attr in ATTRIBUTES),
+                )
+
+        self.connection.executemany(INSERT_WINNER, rows())
+        return count
+
+    def import_csv(self, path, if_empty=False):
+        """
+        Append the winners of a CSV file written by earlier versions. With
+        if_empty nothing is imported into an archive that already has
+        winners, so concurrent first starts import the file only once.
+        """
+        with self.transaction():
+            if if_empty and self.connection.execute("SELECT 1 FROM winners LIMIT 1").fetchone():
+                return 0
+            return self._insert(read_winners_csv(path))
+
+    def find(self, life_type=None, at_least=None, at_most=None, limit=None):
+        """
+        Return (life_type, parameters, streak) of the winners of a type (any
+        type if None) whose attributes are within the given bounds, newest
+        first. at_least and at_most map attribute names to values.
+        """
+        conditions = []
+        values = []
+        if life_type is not None:
+            conditions.append("life_type = ?")
+            values.append(life_type)
+        for bounds, operator in ((at_least, '>='), (at_most, '<=')):
+            for attr, value in (bounds or {}).items():
+                if attr not in ATTRIBUTE_COLORS:
+                    raise ValueError(f"unknown attribute {attr!r}")
+                conditions.append(f"{attr} {operator} ?")
+                values.append(value)
+        query = SELECT_WINNER
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            values.append(limit)
+        return [_winner_from_row(row) for row in self.connection.execute(query, values)]
+
+    def win_counts(self):
+        # Number of games won by each type
+        return dict(self.connection.execute("SELECT life_type, COUNT(*) FROM winners GROUP BY life_type"))
+
+
+# Function to load the last winner and its streak
+def load_last_winning_parameters(path=WINNERS_DB, read_only=False):
+    with WinnerArchive(path, read_only=read_only) as archive:
+        return archive.latest()
+
+
+# Function to append one winner
+def append_winning_parameters(winner_type, winning_parameters, path=WINNERS_DB):
+    with WinnerArchive(path) as archive:
+        archive.add(winner_type, winning_parameters)
+
+
+# Function to parse ATTRIBUTE=VALUE command line bounds
+def _parse_bounds(bounds):
+    parsed = {}
+    for bound in bounds:
+        attr, _, value = bound.partition('=')
+        parsed[attr] = int(value)
+    return parsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import and query the SynthLife winner archive.")
+    parser.add_argument('--db', default=WINNERS_DB, help="winner archive (default: %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_parser = commands.add_parser('import', help="append the winners of a CSV file")
+    import_parser.add_argument('csv', help="winners CSV file")
+    query_parser = commands.add_parser('query', help="list winners, newest first")
+    query_parser.add_argument('--type', default=None, help="only winners of this type")
+    query_parser.add_argument('--at-least', nargs='*', default=[], metavar='ATTRIBUTE=VALUE')
+    query_parser.add_argument('--at-most', nargs='*', default=[], metavar='ATTRIBUTE=VALUE')
+    query_parser.add_argument('--limit', type=int, default=20, help="most winners listed")
+    args = parser.parse_args(argv)
+
+    with WinnerArchive(args.db) as archive:
+        if args.command == 'import':
+            print(f"Imported {archive.import_csv(args.csv)} winners into {args.db}")
+        else:
+            winners = archive.find(args.type, _parse_bounds(args.at_least), _parse_bounds(args.at_most), args.limit)
+            for life_type, parameters, streak in winners:
+                attributes = ' '.join(f"{attr}={value}" for attr, value in parameters['attributes'].items())
+                print(f"{life_type} streak {streak}: {attributes}")
+            life_type, _, streak = archive.latest()
+            print(f"Wins by type: {archive.win_counts()}; latest {life_type} on a streak of {streak}")
+
+
+if __name__ == "__main__":
+    main()